@@ -1,18 +1,276 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import threading
+import time
+import uuid
 
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from flask_caching import Cache
-from datetime import date
+from api import metrics
+from api.database import RoutingSQLAlchemy, configure_database
+from api.lru import LRUCache
 
-db = SQLAlchemy()
-cache = Cache()
+
+class InstrumentedCache(Cache):
+    """Two-tier cache: a size-bounded in-process LRU (L1) in front of the configured backend (L2).
+
+    L1 entries live for at most L1_CACHE_TIMEOUT seconds and are dropped on every write. With the redis backend,
+    writes are also published on L1_CACHE_CHANNEL so the other workers drop them too. Generation and lock keys are
+    never kept in L1, since they must be read from the shared backend. Values returned from L1 are shared between
+    callers and must not be mutated. Hits, misses and writes are counted per tier and key family for /metrics.
+    """
+
+    def init_app(self, app, config=None):
+        super().init_app(app, config)
+        self.close()
+        self.l1 = LRUCache(int(app.config['L1_CACHE_SIZE']))
+        self.l1_timeout = float(app.config['L1_CACHE_TIMEOUT'])
+        self.l1_channel = app.config['L1_CACHE_CHANNEL']
+        self.node_id = None
+        self._logger = app.logger
+        self._client = getattr(app.extensions['cache'][self], '_write_client', None)
+        self._listener = None
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+        if not hasattr(self._client, 'pubsub') or not self.l1.maxsize:
+            self._client = None
+
+    def close(self):
+        """Stop listening for invalidations, e.g. before init_app is called again for another app."""
+        if getattr(self, '_listener', None) is not None:
+            self._stop.set()
+            self._listener.join()
+            self._listener = None
+            self._listener_pid = None
+
+    def _ensure_listener(self):
+        """Subscribe to invalidations on first use in each process, so init_app() opens no connection and workers
+        forked after it each get their own subscription and node id."""
+        if self._client is None or self._listener_pid == os.getpid():
+            return
+
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+
+            self.node_id = uuid.uuid4().hex
+            self.l1.clear()
+
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.l1_channel)
+            except Exception as err:
+                self._logger.error(f'Exception while listening for cache invalidations: {err}')
+                pubsub = None
+
+            self._stop = threading.Event()
+            self._listener = threading.Thread(target=self._listen, args=(self._stop, pubsub), daemon=True,
+                                              name='cache-l1-invalidation')
+            self._listener.start()
+            self._listener_pid = os.getpid()
+
+    def _listen(self, stop, pubsub):
+        while not stop.is_set():
+            try:
+                if pubsub is None:
+                    pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.l1_channel)
+                    self.l1.clear()
+
+                message = pubsub.get_message(timeout=1.0)
+            except Exception as err:
+                self._logger.error(f'Exception while listening for cache invalidations: {err}')
+                pubsub = None
+                self.l1.clear()
+                stop.wait(1.0)
+                continue
+
+            if message is None:
+                continue
+
+            try:
+                data = message['data']
+                node_id, _, keys = (data.decode('utf-8') if isinstance(data, bytes) else data).partition(' ')
+
+                if node_id == self.node_id:
+                    continue
+
+                keys = keys if keys == '*' else json.loads(keys)
+
+                if keys != '*' and not isinstance(keys, list):
+                    raise ValueError('expected a list of keys')
+            except Exception as err:
+                # A message that can not be parsed may still have been an invalidation, so drop everything.
+                self._logger.error(f'Exception while reading cache invalidation {message.get("data")!r}: {err}')
+                keys = '*'
+
+            if keys == '*':
+                self.l1.clear()
+            else:
+                for key in keys:
+                    self.l1.delete(key)
+
+        if pubsub is not None:
+            pubsub.close()
+
+    def _publish(self, keys):
+        if self._client is None:
+            return
+
+        self._ensure_listener()
+
+        try:
+            self._client.publish(self.l1_channel, f'{self.node_id} {keys if keys == "*" else json.dumps(keys)}')
+        except Exception as err:
+            self._logger.error(f'Exception while publishing cache invalidation: {err}')
+
+    def _l1_keys(self, keys):
+        return [key for key in keys if metrics.get_key_family(key) not in ('generation', 'lock')]
+
+    def _invalidate(self, keys):
+        keys = self._l1_keys(keys)
+
+        for key in keys:
+            self.l1.delete(key)
+
+        if keys:
+            self._publish(keys)
+
+    def get(self, key):
+        self._ensure_listener()
+        cached = bool(self._l1_keys([key]))
+
+        if cached:
+            value = self.l1.get(key)
+            metrics.record_l1_cache(key, 'miss' if value is None else 'hit')
+
+            if value is not None:
+                return value
+
+        value = super().get(key)
+        metrics.record_cache(key, 'miss' if value is None else 'hit')
+
+        if cached and value is not None:
+            self.l1.set(key, value, time.time() + self.l1_timeout)
+
+        return value
+
+    def get_many(self, *keys):
+        self._ensure_listener()
+        values = [None] * len(keys)
+        cached = set(self._l1_keys(keys))
+
+        for index, key in enumerate(keys):
+            if key in cached:
+                values[index] = self.l1.get(key)
+                metrics.record_l1_cache(key, 'miss' if values[index] is None else 'hit')
+
+        missing = [index for index, value in enumerate(values) if value is None]
+
+        if missing:
+            expires_at = time.time() + self.l1_timeout
+
+            for index, value in zip(missing, super().get_many(*[keys[index] for index in missing])):
+                metrics.record_cache(keys[index], 'miss' if value is None else 'hit')
+                values[index] = value
+
+                if keys[index] in cached and value is not None:
+                    self.l1.set(keys[index], value, expires_at)
+
+        return values
+
+    def set(self, key, value, timeout=None):
+        metrics.record_cache(key, 'set')
+        result = super().set(key, value, timeout)
+        self._invalidate([key])
+        return result
+
+    def set_many(self, mapping, timeout=None):
+        for key in mapping:
+            metrics.record_cache(key, 'set')
+
+        result = super().set_many(mapping, timeout)
+        self._invalidate(list(mapping))
+        return result
+
+    def delete(self, key):
+        result = super().delete(key)
+        self._invalidate([key])
+        return result
+
+    def delete_many(self, *keys):
+        result = super().delete_many(*keys)
+        self._invalidate(list(keys))
+        return result
+
+    def clear(self):
+        result = super().clear()
+        self.l1.clear()
+        self._publish('*')
+        return result
+
+
+db = RoutingSQLAlchemy()
+cache = InstrumentedCache()
+_log_handler = None
+
+
+class BackgroundFileHandler(QueueHandler):
+    """Queue records for a background thread that writes them to a rotating log file.
+
+    The file is opened and the thread started by the first record logged in each process, so creating the app opens
+    nothing and a master process can create it before forking its workers.
+    """
+
+    def __init__(self, log_file, max_bytes, backup_count):
+        super().__init__(None)
+        self.log_file = log_file
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._pid = None
+
+    def _start(self):
+        os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+        file_handler = RotatingFileHandler(self.log_file, maxBytes=self.max_bytes, backupCount=self.backup_count)
+        file_handler.setFormatter(logging.Formatter("[%(asctime)s] {%(pathname)s:%(lineno)d} %(levelname)s - %(message)s"))
+
+        self.queue = queue.SimpleQueue()
+        listener = QueueListener(self.queue, file_handler)
+        listener.start()
+        atexit.register(listener.stop)
+        self._pid = os.getpid()
+
+    def enqueue(self, record):
+        # Called under the handler lock, which logging re-creates in forked children.
+        if self._pid != os.getpid():
+            self._start()
+
+        super().enqueue(record)
+
+
+def configure_logging(app):
+    """Send app.logger records to a BackgroundFileHandler shared by every app of the process."""
+    global _log_handler
+
+    if _log_handler is None:
+        _log_handler = BackgroundFileHandler(app.config['LOG_FILE'], int(app.config['LOG_MAX_BYTES']),
+                                             int(app.config['LOG_BACKUP_COUNT']))
+
+    if _log_handler not in app.logger.handlers:
+        app.logger.addHandler(_log_handler)
+
+    app.logger.setLevel(str(app.config['LOG_LEVEL']).upper())
 
 
 def create_app():
     app = Flask(__name__, instance_relative_config=False)
     app.config.from_object('config.Config')
+    configure_database(app)
 
     db.init_app(app)
     cache.init_app(app)
@@ -22,21 +280,19 @@ def create_app():
         from api.routes.login import login_bp
         from api.routes.person import person_bp
         from api.routes.errors import errors_bp
-
-        db.create_all()
+        from api.routes.metrics import metrics_bp
+        from api.commands import register_commands
 
         app.register_blueprint(cache_bp, url_prefix='/cache')
         app.register_blueprint(login_bp, url_prefix='/login')
         app.register_blueprint(person_bp, url_prefix='/person')
         app.register_blueprint(errors_bp)
+        app.register_blueprint(metrics_bp)
+
+        metrics.init_app(app)
 
-        app.cache = Cache(app)
+        register_commands(app)
 
-        formatter = logging.Formatter("[%(asctime)s] {%(pathname)s:%(lineno)d} %(levelname)s - %(message)s")
-        handler = RotatingFileHandler(f'logs/{date.today()}.log', maxBytes=10000, backupCount=1)
-        handler.setLevel(logging.DEBUG)
-        handler.setFormatter(formatter)
-        app.logger.addHandler(handler)
-        app.logger.setLevel(logging.DEBUG)
+        configure_logging(app)
 
         return app
@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import threading
+import time
+
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from flask import current_app as app, jsonify, request
+from api import cache
+from api.database import get_cache_timeout
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_generation(name):
+    """Return the current generation of a family of cache keys.
+
+    A missing generation (e.g. after an eviction) is seeded with the current time, so keys built with an older
+    generation can never be read again. That makes it safe for generations to expire: they live for
+    CACHE_GENERATION_TIMEOUT seconds, which must be at least the longest page timeout plus CACHE_STALE_TIMEOUT, so
+    the generation keys of persons that are not read anymore do not pile up in the cache.
+    """
+    key = f'{name}_generation'
+    generation = cache.get(key)
+
+    if generation is None:
+        cache.add(key, int(time.time() * 1000), timeout=int(app.config['CACHE_GENERATION_TIMEOUT']))
+        generation = cache.get(key)
+
+    return generation
+
+
+def bump_generation(name):
+    """Invalidate every key built with the current generation of name with a single increment."""
+    key = f'{name}_generation'
+
+    if cache.get(key) is None:
+        get_generation(name)
+
+    return cache.cache.inc(key)
+
+
+def get_person_product_list_cache_key(person_id, page):
+    return f'products_person_{person_id}_{get_generation(f"products_person_{person_id}")}_page_{page}'
+
+
+def clear_person_product_list_cache(person_id):
+    """Invalidate every cached product list page of a person, whatever the number of pages."""
+    app.logger.debug(f'Bumping cache generation: products_person_{person_id}')
+    bump_generation(f'products_person_{person_id}')
+
+
+def _get_entry(key):
+    """Return the entry stored by _store under key, or None; values of any other shape (e.g. written under the same
+    key by an older release) count as a miss and are overwritten."""
+    entry = cache.get(key)
+    return entry if isinstance(entry, dict) and 'value' in entry and 'fresh_until' in entry else None
+
+
+def _store(key, value, timeout, stale_timeout):
+    timeout = get_cache_timeout(app, timeout)
+
+    if isinstance(value, dict) and value.get('degraded'):
+        timeout = min(timeout, int(app.config['DEGRADED_CACHE_TIMEOUT']))
+
+    cache.set(key, {'value': value, 'fresh_until': time.time() + timeout}, timeout + stale_timeout)
+
+
+def _compute(key, compute, timeout, stale_timeout):
+    """Run compute once per key in this process, and at most once per lock timeout across workers.
+
+    Concurrent callers for the same key wait for the running computation instead of starting their own, for at most
+    the lock timeout: past it they use the entry if it was stored meanwhile, or compute the value themselves.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+
+        if leader:
+            flight = _flights[key] = Future()
+
+    lock_timeout = int(app.config['CACHE_LOCK_TIMEOUT'])
+
+    if not leader:
+        try:
+            return flight.result(timeout=lock_timeout)
+        except FutureTimeoutError:
+            app.logger.warning(f'Timed out waiting for cache key ({key}), computing it in this request')
+            entry = _get_entry(key)
+            return entry['value'] if entry is not None else compute()
+
+    locked = False
+
+    try:
+        locked = cache.add(f'{key}_lock', True, timeout=lock_timeout)
+
+        if not locked:
+            deadline = time.monotonic() + lock_timeout
+
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = _get_entry(key)
+
+                if entry is not None:
+                    flight.set_result(entry['value'])
+                    return entry['value']
+
+        value = compute()
+        _store(key, value, timeout, stale_timeout)
+        flight.set_result(value)
+        return value
+    except Exception as err:
+        flight.set_exception(err)
+        raise
+    finally:
+        if locked:
+            cache.delete(f'{key}_lock')
+
+        with _flights_lock:
+            del _flights[key]
+
+
+def _refresh(flask_app, key, compute, timeout, stale_timeout):
+    with flask_app.app_context():
+        try:
+            _store(key, compute(), timeout, stale_timeout)
+        except Exception as err:
+            flask_app.logger.error(f'Exception while refreshing cache key ({key}): {err}')
+        finally:
+            cache.delete(f'{key}_refresh')
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=None):
+    """Return the cached value of key, calling compute() on a miss.
+
+    Concurrent misses for the same key share one call to compute(). After timeout seconds the entry is stale but
+    is still served for stale_timeout more seconds while a single background thread refreshes it. compute() must
+    not depend on the request, only on the application context.
+    """
+    if stale_timeout is None:
+        stale_timeout = int(app.config['CACHE_STALE_TIMEOUT'])
+
+    entry = _get_entry(key)
+
+    if entry is None:
+        return _compute(key, compute, timeout, stale_timeout)
+
+    if entry['fresh_until'] < time.time() and cache.add(f'{key}_refresh', True, timeout=int(app.config['CACHE_LOCK_TIMEOUT'])):
+        threading.Thread(target=_refresh, args=(app._get_current_object(), key, compute, timeout, stale_timeout),
+                         daemon=True).start()
+
+    return entry['value']
+
+
+def _render(compute):
+    body, status = compute()
+    data = jsonify(body).get_data()
+    rendered = {'status': status, 'data': data, 'etag': hashlib.sha1(data).hexdigest()}
+
+    if body.get('degraded'):
+        rendered['degraded'] = True
+
+    if len(data) >= int(app.config['RESPONSE_COMPRESSION_MIN_SIZE']):
+        rendered['gzip'] = gzip.compress(data, int(app.config['RESPONSE_COMPRESSION_LEVEL']))
+
+        if brotli is not None:
+            rendered['br'] = brotli.compress(data)
+
+    return rendered
+
+
+def get_encoded_etag(etag, encoding):
+    """ETag of the variant of a cached body compressed with encoding."""
+    return f'{etag}-{encoding}'
+
+
+def get_cached_response(key, compute, timeout, stale_timeout=None):
+    """Build a response from a cached (body, status) pair, answering conditional requests with 304.
+
+    The body is stored already serialized (and compressed when it is large enough), together with a strong ETag,
+    so a hit only copies bytes: a matching If-None-Match gets a 304 and anything else gets the stored variant that
+    best matches Accept-Encoding. Strong validators must differ between content-codings, so each variant has its own
+    ETag (<hash>, <hash>-gzip, <hash>-br); If-None-Match matches any of them, as they only differ in coding.
+    """
+    rendered = get_or_compute(key, lambda: _render(compute), timeout, stale_timeout)
+    encodings = [encoding for encoding in ('br', 'gzip') if encoding in rendered]
+    encoding = request.accept_encodings.best_match(encodings)
+    etags = [rendered['etag']] + [get_encoded_etag(rendered['etag'], name) for name in encodings]
+
+    if rendered['status'] == 200 and any(request.if_none_match.contains_weak(etag) for etag in etags):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(rendered[encoding] if encoding else rendered['data'], rendered['status'],
+                                      mimetype=app.config['JSONIFY_MIMETYPE'])
+
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.vary.add('Accept-Encoding')
+    response.set_etag(get_encoded_etag(rendered['etag'], encoding) if encoding else rendered['etag'])
+    return response
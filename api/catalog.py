@@ -0,0 +1,94 @@
+import datetime
+import uuid
+
+from flask import current_app as app
+from api import db, cache
+from api.models import Product
+from api.products import get_product_cache_key, get_session, parse_product
+
+SNAPSHOT_FIELDS = ('title', 'image', 'price', 'review_score')
+
+
+def fetch_catalog_page(page):
+    """Return the products of a page of the external catalog, or None past the last page."""
+    timeout = (float(app.config['EXTERNAL_API_CONNECT_TIMEOUT']), float(app.config['EXTERNAL_API_READ_TIMEOUT']))
+    response = get_session().get(app.config['EXTERNAL_CATALOG_API'].replace('|PAGE|', str(page)), timeout=timeout)
+
+    if response.status_code == 404:
+        return None
+
+    response.raise_for_status()
+    return response.json().get('products') or None
+
+
+def sync_catalog_page(products, now, max_age):
+    """Upsert one catalog page into the product snapshot table, writing only changed or stale rows."""
+    payloads = {uuid.UUID(str(product['id'])): parse_product(product['id'], product) for product in products}
+    snapshots = {product.id: product for product in Product.query.filter(Product.id.in_(list(payloads)))}
+    inserts = []
+    updates = []
+    changed = {}
+    stats = {'inserted': 0, 'updated': 0, 'refreshed': 0, 'unchanged': 0}
+
+    for product_id, payload in payloads.items():
+        values = {field: payload[field] for field in SNAPSHOT_FIELDS}
+        snapshot = snapshots.get(product_id)
+
+        if snapshot is None:
+            inserts.append(dict(values, id=product_id, update_date=now, sync_date=now))
+            changed[get_product_cache_key(product_id)] = payload
+            stats['inserted'] += 1
+        elif any(getattr(snapshot, field) != value for field, value in values.items()):
+            updates.append(dict(values, id=product_id, update_date=now, sync_date=now))
+            changed[get_product_cache_key(product_id)] = payload
+            stats['updated'] += 1
+        elif snapshot.sync_date is None or snapshot.sync_date < now - max_age:
+            updates.append({'id': product_id, 'sync_date': now})
+            stats['refreshed'] += 1
+        else:
+            stats['unchanged'] += 1
+
+    if inserts:
+        db.session.bulk_insert_mappings(Product, inserts)
+
+    if updates:
+        db.session.bulk_update_mappings(Product, updates)
+
+    db.session.commit()
+
+    if changed:
+        cache.set_many(changed, int(app.config['PRODUCT_CACHE_TIMEOUT']))
+
+    return stats
+
+
+def sync_catalog():
+    """Page through EXTERNAL_CATALOG_API and refresh the local product snapshot table.
+
+    Unchanged rows only get their sync_date bumped once it is older than half of PRODUCT_SNAPSHOT_MAX_AGE, so a sync
+    running more often than that keeps them servable without rewriting the whole table.
+    """
+    now = datetime.datetime.utcnow()
+    max_age = datetime.timedelta(seconds=int(app.config['PRODUCT_SNAPSHOT_MAX_AGE']) / 2)
+    stats = {'pages': 0, 'inserted': 0, 'updated': 0, 'refreshed': 0, 'unchanged': 0}
+    page = 1
+
+    while True:
+        products = fetch_catalog_page(page)
+
+        if not products:
+            break
+
+        for key, value in sync_catalog_page(products, now, max_age).items():
+            stats[key] += value
+
+        stats['pages'] += 1
+        page += 1
+
+    app.logger.info(f'Catalog sync: {stats}')
+    return stats
+
+
+def get_snapshot_max_date():
+    """Snapshots synced before this date are stale and must not be served."""
+    return datetime.datetime.utcnow() - datetime.timedelta(seconds=int(app.config['PRODUCT_SNAPSHOT_MAX_AGE']))
@@ -0,0 +1,105 @@
+import click
+import time
+import requests
+
+from sqlalchemy import inspect
+from api import db
+from api.catalog import sync_catalog
+from api.models import get_uuid_storage, migrate_uuid_storage, repair_product_counts
+from api.transfer import ImportDataError, export_ndjson, import_ndjson
+
+
+def register_commands(app):
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the missing tables and indexes; run once per deploy instead of on every worker start."""
+        db.create_all()
+        click.echo(f'Created missing tables in {db.engine.url!r}')
+
+        # create_all() skips existing tables entirely, so indexes added to a model later are created here.
+        inspector = inspect(db.engine)
+
+        for table in db.Model.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name not in existing:
+                    index.create(db.engine)
+                    click.echo(f'Created index {index.name}')
+
+    @app.cli.command('import-ndjson')
+    @click.argument('source', type=click.File('rb'))
+    def import_ndjson_command(source):
+        """Import persons and wishlists from an NDJSON file ('-' for stdin)."""
+        started = time.monotonic()
+
+        try:
+            stats = import_ndjson(source)
+        except ImportDataError as err:
+            raise click.ClickException(f'{err} (imported so far: {err.stats})')
+
+        elapsed = time.monotonic() - started
+        rows = stats['person'] + stats['product']
+        click.echo(f'Imported {stats["person"]} persons and {stats["product"]} products '
+                   f'in {elapsed:.2f}s ({rows / elapsed if elapsed else rows:.0f} rows/s)')
+
+    @app.cli.command('export-ndjson')
+    @click.argument('target', type=click.File('w'))
+    def export_ndjson_command(target):
+        """Export persons and wishlists as NDJSON to a file ('-' for stdout)."""
+        for line in export_ndjson():
+            target.write(line)
+
+    @app.cli.command('sync-catalog')
+    @click.option('--interval', type=int, default=0, help='Keep running, syncing every INTERVAL seconds.')
+    def sync_catalog_command(interval):
+        """Refresh the local product snapshot table from the external catalog."""
+        while True:
+            started = time.monotonic()
+
+            try:
+                stats = sync_catalog()
+            except requests.RequestException as err:
+                if not interval:
+                    raise click.ClickException(f'Catalog sync failed: {err}')
+
+                click.echo(f'Catalog sync failed: {err}', err=True)
+                time.sleep(interval)
+                continue
+
+            click.echo(f'Synced {stats["pages"]} catalog pages in {time.monotonic() - started:.2f}s: '
+                       f'{stats["inserted"]} inserted, {stats["updated"]} updated, {stats["refreshed"]} refreshed, '
+                       f'{stats["unchanged"]} unchanged')
+
+            if not interval:
+                break
+
+            time.sleep(interval)
+
+    @app.cli.command('repair-product-counts')
+    def repair_product_counts_command():
+        """Backfill Person.product_count from the wishlists, adding the column to older databases first."""
+        if 'product_count' not in {column['name'] for column in inspect(db.engine).get_columns('person')}:
+            db.session.execute('ALTER TABLE person ADD COLUMN product_count INTEGER NOT NULL DEFAULT 0')
+            db.session.commit()
+            click.echo('Added column person.product_count')
+
+        started = time.monotonic()
+        repaired = repair_product_counts()
+        click.echo(f'Repaired the product count of {repaired} persons in {time.monotonic() - started:.2f}s')
+
+    @app.cli.command('migrate-uuid-storage')
+    @click.option('--chunk-size', type=int, default=None, help='Rows copied per batch (default: IMPORT_CHUNK_SIZE).')
+    def migrate_uuid_storage_command(chunk_size):
+        """Convert the person, productlist and product keys to the configured UUID_STORAGE."""
+        current = get_uuid_storage()
+        target = app.config['UUID_STORAGE']
+
+        if current in (target, 'native'):
+            click.echo(f'Keys are already stored as {current}, nothing to migrate')
+            return
+
+        started = time.monotonic()
+        stats = migrate_uuid_storage(chunk_size or int(app.config['IMPORT_CHUNK_SIZE']))
+        click.echo(f'Converted keys from {current} to {target} in {time.monotonic() - started:.2f}s: ' +
+                   ', '.join(f'{rows} {table} rows' for table, rows in stats.items()))
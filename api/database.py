@@ -0,0 +1,95 @@
+from flask import g, has_app_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy_utils import UUIDType
+
+from config import Config
+
+REPLICA_BIND = 'replica'
+
+
+def is_enabled(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def uuid_type():
+    """Column type of the UUID keys, from UUID_STORAGE.
+
+    'string' keeps the 32-char hex CHAR(32) columns, 'binary' stores 16 bytes (BINARY(16)) on SQLite and MySQL.
+    PostgreSQL uses its native uuid type either way. Column types are fixed when the models are imported, so this reads
+    the environment instead of the app config; existing databases are converted with `flask migrate-uuid-storage`.
+    """
+    return UUIDType(binary=Config.UUID_STORAGE == 'binary')
+
+
+def configure_database(app):
+    """Register the replica bind when DB_REPLICA_URI is set."""
+    if app.config['DB_REPLICA_URI']:
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: app.config['DB_REPLICA_URI']}
+
+
+def read_from_replica(enabled=True):
+    """Send the reads of the current request to the replica, until the request writes something."""
+    g.db_read_replica = enabled
+
+
+def use_replica(app):
+    return has_app_context() and g.get('db_read_replica', False) and \
+        REPLICA_BIND in (app.config['SQLALCHEMY_BINDS'] or {})
+
+
+def get_cache_timeout(app, timeout):
+    """Cache timeout for a value computed now: values that may have been read from the replica, which can lag behind
+    the primary, are kept for at most DB_REPLICA_CACHE_TIMEOUT seconds, so a write is not hidden for the full timeout.
+    """
+    if use_replica(app):
+        return min(timeout, int(app.config['DB_REPLICA_CACHE_TIMEOUT']))
+
+    return timeout
+
+
+class RoutingSession(SignallingSession):
+    """Session that reads from the replica bind when the request asked for it.
+
+    Flushes always go to the primary, and once a request has flushed, its later reads go to the primary too, so a
+    request always reads its own writes.
+    """
+
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self._db = db
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and use_replica(self.app):
+            return self._db.get_engine(self.app, bind=REPLICA_BIND)
+
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    if has_app_context():
+        g.db_read_replica = False
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_pool_defaults(self, app, options):
+        """Pool options for every engine (primary and replica), from the DB_* settings."""
+        options.update({
+            'pool_size': int(app.config['DB_POOL_SIZE']),
+            'max_overflow': int(app.config['DB_MAX_OVERFLOW']),
+            'pool_timeout': float(app.config['DB_POOL_TIMEOUT']),
+            'pool_recycle': int(app.config['DB_POOL_RECYCLE']),
+            'pool_pre_ping': is_enabled(app.config['DB_POOL_PRE_PING'])
+        })
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        # SQLite files are not pooled by size: Flask-SQLAlchemy only picks its NullPool when pool_size is unset.
+        if sa_url.drivername == 'sqlite':
+            for option in ('pool_size', 'max_overflow', 'pool_timeout'):
+                options.pop(option, None)
+
+        return super().apply_driver_hacks(app, sa_url, options)
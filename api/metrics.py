@@ -0,0 +1,233 @@
+import threading
+import time
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+
+        for labels, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, labels)} {value}')
+
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+
+        for labels, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, labels)} {value}')
+
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+
+            entry[1] += value
+            entry[2] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels + ("le",), labels + (bound,))} {bucket_count}')
+
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels + ("le",), labels + ("+Inf",))} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, labels)} {count}')
+
+        return lines
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Request latency per endpoint.',
+                             ('endpoint', 'method', 'status'))
+REQUEST_DB_QUERIES = Histogram('http_request_db_queries', 'SQL statements per request and endpoint.', ('endpoint',),
+                               COUNT_BUCKETS)
+REQUEST_DB_DURATION = Histogram('http_request_db_duration_seconds', 'Time in SQL statements per request and endpoint.',
+                                ('endpoint',))
+REQUEST_EXTERNAL_CALLS = Histogram('http_request_external_api_calls',
+                                   'External product API calls per request and endpoint.', ('endpoint',), COUNT_BUCKETS)
+REQUEST_EXTERNAL_DURATION = Histogram('http_request_external_api_duration_seconds',
+                                      'Time in external product API calls per request and endpoint.', ('endpoint',))
+DB_QUERIES = Counter('db_queries_total', 'SQL statements executed.')
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds', 'SQL statement latency.')
+EXTERNAL_API_DURATION = Histogram('external_api_request_duration_seconds', 'External product API call latency.',
+                                  ('status',))
+EXTERNAL_API_RETRIES = Counter('external_api_retries_total', 'External product API calls retried.')
+EXTERNAL_API_HEDGES = Counter('external_api_hedged_requests_total', 'External product API calls sent twice to cut tail latency.')
+EXTERNAL_API_SHORT_CIRCUITS = Counter('external_api_short_circuits_total',
+                                      'External product API calls skipped because the circuit breaker was open.')
+EXTERNAL_API_CIRCUIT_STATE = Gauge('external_api_circuit_state',
+                                   'External product API circuit breaker state (0 closed, 1 open, 2 half open).')
+CACHE_OPERATIONS = Counter('cache_operations_total', 'Shared cache (L2) lookups and writes per key family.',
+                           ('family', 'result'))
+CACHE_L1_OPERATIONS = Counter('cache_l1_operations_total', 'In-process cache (L1) lookups per key family.',
+                              ('family', 'result'))
+RATE_LIMITED = Counter('http_rate_limited_total', 'Requests shed with 429 per route family and limit.',
+                       ('family', 'limit'))
+EXTERNAL_API_CIRCUIT_STATE.set(0)
+
+REGISTRY = [REQUEST_DURATION, REQUEST_DB_QUERIES, REQUEST_DB_DURATION, REQUEST_EXTERNAL_CALLS, REQUEST_EXTERNAL_DURATION,
+            DB_QUERIES, DB_QUERY_DURATION, EXTERNAL_API_DURATION, EXTERNAL_API_RETRIES,
+            EXTERNAL_API_HEDGES, EXTERNAL_API_SHORT_CIRCUITS, EXTERNAL_API_CIRCUIT_STATE, CACHE_L1_OPERATIONS,
+            CACHE_OPERATIONS, RATE_LIMITED]
+
+
+def expose():
+    lines = []
+
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+
+    return '\n'.join(lines) + '\n'
+
+
+def get_key_family(key):
+    if key.endswith('_generation'):
+        return 'generation'
+
+    if key.endswith('_lock') or key.endswith('_refresh'):
+        return 'lock'
+
+    for prefix in ('person_list', 'products_person', 'product', 'person'):
+        if key.startswith(prefix):
+            return prefix
+
+    return 'other'
+
+
+def get_request_metrics():
+    """Per-request breakdown, shared by the slow request log; None outside of a request."""
+    return g.get('request_metrics') if has_app_context() else None
+
+
+def record(name, amount=1, duration=0.0):
+    request_metrics = get_request_metrics()
+
+    if request_metrics is not None:
+        request_metrics[f'{name}_count'] += amount
+        request_metrics[f'{name}_time'] += duration
+
+
+def record_cache(key, result):
+    CACHE_OPERATIONS.inc(get_key_family(key), result)
+
+    if result in ('hit', 'miss'):
+        record(f'cache_{result}')
+
+
+def record_l1_cache(key, result):
+    CACHE_L1_OPERATIONS.inc(get_key_family(key), result)
+
+    if result == 'hit':
+        record('cache_hit')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    DB_QUERIES.inc()
+    DB_QUERY_DURATION.observe(elapsed)
+    record('db', duration=elapsed)
+
+
+def init_app(app):
+    app.before_request(start_request)
+    app.after_request(lambda response: finish_request(app, request, response))
+
+
+def start_request():
+    g.request_metrics = dict.fromkeys(('db_count', 'db_time', 'external_count', 'external_time', 'cache_hit_count',
+                                       'cache_hit_time', 'cache_miss_count', 'cache_miss_time'), 0)
+    g.request_started = time.perf_counter()
+
+
+def finish_request(app, request, response):
+    started = g.get('request_started')
+
+    if started is None:
+        return response
+
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or 'unknown'
+    request_metrics = g.request_metrics
+    REQUEST_DURATION.observe(elapsed, endpoint, request.method, response.status_code)
+    REQUEST_DB_QUERIES.observe(request_metrics['db_count'], endpoint)
+    REQUEST_DB_DURATION.observe(request_metrics['db_time'], endpoint)
+    REQUEST_EXTERNAL_CALLS.observe(request_metrics['external_count'], endpoint)
+    REQUEST_EXTERNAL_DURATION.observe(request_metrics['external_time'], endpoint)
+    threshold = float(app.config['SLOW_REQUEST_THRESHOLD'])
+
+    if threshold and elapsed >= threshold:
+        app.logger.warning(
+            f'Slow request: {request.method} {request.path} {response.status_code} {elapsed * 1000:.1f}ms '
+            f'(db: {request_metrics["db_count"]} queries, {request_metrics["db_time"] * 1000:.1f}ms; '
+            f'external api: {request_metrics["external_count"]} calls, {request_metrics["external_time"] * 1000:.1f}ms; '
+            f'cache: {request_metrics["cache_hit_count"]} hits, {request_metrics["cache_miss_count"]} misses)')
+
+    return response
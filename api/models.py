@@ -1,6 +1,8 @@
 from api import db
+from api.database import uuid_type
 from marshmallow import Schema, fields
-from uuid import uuid4
+from uuid import UUID, uuid4
+from sqlalchemy import inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy_utils import UUIDType
 import datetime
@@ -11,27 +13,133 @@ Base.query = db.session.query_property()
 
 class Person(db.Model):
     __tablename__ = 'person'
-    id = db.Column(UUIDType(binary=False), primary_key=True, default=uuid4)
+    id = db.Column(uuid_type(), primary_key=True, default=uuid4)
     name = db.Column(db.String(50), nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
     product_list_id = db.relationship('ProductList', backref='person')
     create_date = db.Column(db.DateTime, index=True, default=datetime.datetime.utcnow)
+    product_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 
 class ProductList(db.Model):
     __tablename__ = 'productlist'
-    person_id = db.Column(UUIDType(binary=False), db.ForeignKey('person.id'), primary_key=True)
-    product_id = db.Column(UUIDType(binary=False), primary_key=True)
+    person_id = db.Column(uuid_type(), db.ForeignKey('person.id'), primary_key=True)
+    product_id = db.Column(uuid_type(), primary_key=True)
     insert_date = db.Column(db.DateTime, index=True, default=datetime.datetime.utcnow)
 
     __table_args__ = (
         db.PrimaryKeyConstraint(
             person_id,
             product_id
-        ), {}
+        ),
+        db.Index('ix_productlist_person_id_insert_date_product_id', person_id, insert_date, product_id),
+        {}
     )
 
 
+class Product(db.Model):
+    __tablename__ = 'product'
+    id = db.Column(uuid_type(), primary_key=True)
+    title = db.Column(db.String(255), nullable=False)
+    image = db.Column(db.String(255))
+    price = db.Column(db.Float)
+    review_score = db.Column(db.Float)
+    update_date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    sync_date = db.Column(db.DateTime, index=True, default=datetime.datetime.utcnow)
+
+
+def update_product_counts(deltas):
+    """Add deltas ({person_id: amount}) to Person.product_count in the current transaction, with one statement."""
+    deltas = [{'person_id': person_id, 'amount': amount} for person_id, amount in deltas.items() if amount]
+
+    if deltas:
+        db.session.execute(Person.__table__.update()
+                           .where(Person.id == db.bindparam('person_id'))
+                           .values(product_count=Person.product_count + db.bindparam('amount')), deltas)
+
+
+def repair_product_counts():
+    """Recompute Person.product_count from ProductList; return the number of persons whose counter was wrong."""
+    actual = db.select([db.func.count()]).where(ProductList.person_id == Person.id).as_scalar()
+    repaired = Person.query.filter(Person.product_count != actual).update({Person.product_count: actual},
+                                                                         synchronize_session=False)
+    db.session.commit()
+    return repaired
+
+
+UUID_TABLES = (Person.__table__, ProductList.__table__, Product.__table__)
+
+
+def get_uuid_storage():
+    """How the database currently stores the key columns: 'native' (PostgreSQL), 'binary' or 'string'."""
+    if db.engine.dialect.name == 'postgresql':
+        return 'native'
+
+    column = next(column for column in inspect(db.engine).get_columns('person') if column['name'] == 'id')
+    return 'string' if isinstance(column['type'], db.String) else 'binary'
+
+
+def _to_uuid(value):
+    if value is None or isinstance(value, UUID):
+        return value
+
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return UUID(bytes=bytes(value))
+
+    return UUID(value)
+
+
+def migrate_uuid_storage(chunk_size):
+    """Rebuild the keyed tables with the key column types of the models (UUID_STORAGE), converting every row.
+
+    Each table is renamed to <name>_old, recreated with its indexes and copied over in chunks, all in one transaction
+    where the database supports transactional DDL. Return the number of rows copied per table.
+    """
+    stats = {}
+
+    with db.engine.begin() as connection:
+        old_tables = []
+
+        for table in UUID_TABLES:
+            connection.execute(f'ALTER TABLE {table.name} RENAME TO {table.name}_old')
+            old_table = db.Table(f'{table.name}_old', db.MetaData(), autoload_with=connection)
+
+            # Index names are global in SQLite, so the old ones have to go before the new tables are created.
+            for index in old_table.indexes:
+                index.drop(connection)
+
+            old_tables.append(old_table)
+
+        db.Model.metadata.create_all(connection, tables=UUID_TABLES)
+
+        for table, old_table in zip(UUID_TABLES, old_tables):
+            uuid_columns = [column.name for column in table.c if isinstance(column.type, UUIDType)]
+            # Old key values are read as the driver returns them (str or bytes), whatever type the column reflects as.
+            columns = [db.column(column.name) if column.name in uuid_columns else column
+                       for column in old_table.c if column.name in table.c]
+            result = connection.execution_options(stream_results=True).execute(
+                db.select(columns).select_from(old_table))
+            stats[table.name] = 0
+
+            while True:
+                rows = [dict(row) for row in result.fetchmany(chunk_size)]
+
+                if not rows:
+                    break
+
+                for row in rows:
+                    for name in uuid_columns:
+                        row[name] = _to_uuid(row[name])
+
+                connection.execute(table.insert(), rows)
+                stats[table.name] += len(rows)
+
+        for old_table in reversed(old_tables):
+            old_table.drop(connection)
+
+    return stats
+
+
 class PersonSchema(Schema):
     id = fields.UUID()
     name = fields.Str()
@@ -43,3 +151,44 @@ class ProductSchema(Schema):
     person_id = fields.UUID()
     product_id = fields.UUID()
     insert_date = fields.DateTime()
+
+
+class RowSerializer:
+    """Serializer compiled from a marshmallow schema, dumping row tuples queried with `columns`.
+
+    The schema stays the source of truth for field names and formats; this only skips marshmallow's per-field
+    dispatch on hot paths and produces exactly what schema.dump() would.
+    """
+
+    def __init__(self, schema_class, model):
+        schema = schema_class()
+        self.columns = []
+        self.keys = []
+        self.encoders = []
+
+        for name, field in schema.fields.items():
+            self.columns.append(getattr(model, field.attribute or name))
+            self.keys.append(field.data_key or name)
+            self.encoders.append(self._compile_field(field))
+
+    @staticmethod
+    def _compile_field(field):
+        if isinstance(field, fields.DateTime):
+            data_format = field.format or field.DEFAULT_FORMAT
+            return field.SERIALIZATION_FUNCS.get(data_format) or (lambda value: value.strftime(data_format))
+
+        if isinstance(field, fields.String):
+            return str
+
+        return lambda value: field._serialize(value, None, None)
+
+    def dump(self, row):
+        return {key: None if value is None else encode(value)
+                for key, encode, value in zip(self.keys, self.encoders, row)}
+
+    def dump_many(self, rows):
+        return [self.dump(row) for row in rows]
+
+
+person_serializer = RowSerializer(PersonSchema, Person)
+product_serializer = RowSerializer(ProductSchema, ProductList)
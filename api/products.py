@@ -0,0 +1,330 @@
+import random
+import threading
+import time
+import uuid
+import requests
+
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from flask import current_app as app
+from requests.adapters import HTTPAdapter
+from api import cache, metrics
+from api.models import Product
+
+PRODUCT_NOT_FOUND = 'not_found'
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+_hedge_executor = None
+_breaker = None
+
+
+class ProductAPIUnavailable(Exception):
+    """Raised when some products could not be looked up because EXTERNAL_API failed or the circuit is open.
+
+    products holds the partial result, with None for the unavailable products listed in product_ids.
+    """
+
+    def __init__(self, product_ids, products):
+        super().__init__(f'Product API unavailable for {len(product_ids)} products')
+        self.product_ids = product_ids
+        self.products = products
+
+
+class CircuitBreaker:
+    """Stop calling EXTERNAL_API after failure_threshold consecutive failures.
+
+    After reset_timeout seconds the circuit is half open and a single probe call is let through: its success closes
+    the circuit, its failure opens it again for another reset_timeout.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    STATES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        self.state = state
+        metrics.EXTERNAL_API_CIRCUIT_STATE.set(self.STATES[state])
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+                self._probing = False
+
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+
+        metrics.EXTERNAL_API_SHORT_CIRCUITS.inc()
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+                if self.state != self.OPEN:
+                    self._set_state(self.OPEN)
+
+
+def get_session():
+    global _session
+
+    with _lock:
+        if _session is None:
+            pool_size = int(app.config['EXTERNAL_API_MAX_WORKERS'])
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+
+    return _session
+
+
+def get_executor():
+    global _executor
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(app.config['EXTERNAL_API_MAX_WORKERS']),
+                                           thread_name_prefix='product-api')
+
+    return _executor
+
+
+def get_hedge_executor():
+    """Executor for hedged calls, separate from get_executor() so hedges never wait behind a batch."""
+    global _hedge_executor
+
+    with _lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=2 * int(app.config['EXTERNAL_API_MAX_WORKERS']),
+                                                 thread_name_prefix='product-api-hedge')
+
+    return _hedge_executor
+
+
+def get_breaker():
+    global _breaker
+
+    with _lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(int(app.config['EXTERNAL_API_BREAKER_THRESHOLD']),
+                                      float(app.config['EXTERNAL_API_BREAKER_RESET_TIMEOUT']))
+
+    return _breaker
+
+
+def parse_product(product_id, payload):
+    return {
+        'id': product_id,
+        'title': payload['title'],
+        'image': payload['image'],
+        'price': payload['price'],
+        'review_score': payload['reviewScore'] if 'reviewScore' in payload else None
+    }
+
+
+def _get(session, url, timeout, hedge_delay):
+    """GET url, sending a second identical request if the first one has not answered after hedge_delay seconds.
+
+    The first response to arrive wins; the other request is left to finish in the background.
+    """
+    if not hedge_delay:
+        return session.get(url, timeout=timeout)
+
+    executor = get_hedge_executor()
+    futures = [executor.submit(session.get, url, timeout=timeout)]
+
+    if not wait(futures, timeout=hedge_delay).done:
+        metrics.EXTERNAL_API_HEDGES.inc()
+        futures.append(executor.submit(session.get, url, timeout=timeout))
+
+    error = None
+
+    for future in as_completed(futures):
+        try:
+            return future.result()
+        except requests.RequestException as err:
+            error = err
+
+    raise error
+
+
+def _fetch(session, breaker, options, product_id):
+    """Fetch one product, retrying connection errors and 5xx answers with exponential backoff and full jitter.
+
+    Returns (status_code, product, error); status_code is None when every attempt failed or the circuit is open.
+    """
+    endpoint, timeout, retries, backoff, hedge_delay = options
+    url = endpoint.replace('|PRODUCT_ID|', str(product_id))
+    status_code, err = None, None
+
+    for attempt in range(retries + 1):
+        if attempt:
+            metrics.EXTERNAL_API_RETRIES.inc()
+            time.sleep(random.uniform(0, backoff * 2 ** (attempt - 1)))
+
+        if not breaker.allow():
+            return None, None, err or 'circuit breaker is open'
+
+        started = time.perf_counter()
+
+        try:
+            response = _get(session, url, timeout, hedge_delay)
+        except requests.RequestException as error:
+            metrics.EXTERNAL_API_DURATION.observe(time.perf_counter() - started, 'error')
+            breaker.record_failure()
+            status_code, err = None, error
+            continue
+
+        metrics.EXTERNAL_API_DURATION.observe(time.perf_counter() - started, response.status_code)
+
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.record_failure()
+            status_code, err = None, f'HTTP {response.status_code}'
+            continue
+
+        breaker.record_success()
+
+        if response.status_code != 200:
+            return response.status_code, None, None
+
+        return response.status_code, parse_product(product_id, response.json()), None
+
+    return status_code, None, err
+
+
+def fetch_products(product_ids):
+    """Fetch products from EXTERNAL_API in parallel, keeping the order of product_ids.
+
+    Returns a list of (status_code, product) tuples; status_code is None when the request failed or was skipped by
+    the circuit breaker.
+    """
+    if not product_ids:
+        return []
+
+    session = get_session()
+    breaker = get_breaker()
+    options = (app.config['EXTERNAL_API'],
+               (float(app.config['EXTERNAL_API_CONNECT_TIMEOUT']), float(app.config['EXTERNAL_API_READ_TIMEOUT'])),
+               int(app.config['EXTERNAL_API_RETRIES']), float(app.config['EXTERNAL_API_RETRY_BACKOFF']),
+               float(app.config['EXTERNAL_API_HEDGE_DELAY']))
+
+    started = time.perf_counter()
+
+    if len(product_ids) == 1:
+        results = [_fetch(session, breaker, options, product_ids[0])]
+    else:
+        results = list(get_executor().map(lambda product_id: _fetch(session, breaker, options, product_id), product_ids))
+
+    metrics.record('external', len(product_ids), time.perf_counter() - started)
+
+    errors = [(product_id, err) for product_id, (_, _, err) in zip(product_ids, results) if err is not None]
+
+    if errors:
+        app.logger.error('Exception while fetching %d products: %s', len(errors),
+                         '; '.join(f'{product_id}: {err}' for product_id, err in errors))
+
+    return [(status_code, product) for status_code, product, _ in results]
+
+
+def get_product_cache_key(product_id):
+    return f'product_{product_id}'
+
+
+def get_product(product_id):
+    return get_products([product_id])[0]
+
+
+def get_snapshot_products(product_ids):
+    """Products from the local snapshot table whatever their age, keyed by id; the fallback when EXTERNAL_API fails."""
+    ids = []
+
+    for product_id in product_ids:
+        try:
+            ids.append(uuid.UUID(str(product_id)))
+        except ValueError:
+            pass
+
+    return {str(product.id): {
+        'id': product.id,
+        'title': product.title,
+        'image': product.image,
+        'price': product.price,
+        'review_score': product.review_score
+    } for product in Product.query.filter(Product.id.in_(ids))} if ids else {}
+
+
+def get_products(product_ids):
+    """Return the products for product_ids, in order, with None for products that do not exist.
+
+    Products are read from the per-product catalog cache first and only the missing ones are fetched from
+    EXTERNAL_API. Products answered with 404 are cached as PRODUCT_NOT_FOUND for PRODUCT_NOT_FOUND_CACHE_TIMEOUT.
+    Products that could not be fetched are served from the snapshot table, even if stale; when some are not there
+    either, ProductAPIUnavailable is raised with the partial result.
+    """
+    if not product_ids:
+        return []
+
+    keys = [get_product_cache_key(product_id) for product_id in product_ids]
+    products = list(cache.get_many(*keys))
+    missing = [index for index, product in enumerate(products) if product is None]
+
+    if missing:
+        found = {}
+        not_found = {}
+        failed = []
+
+        for index, (status_code, product) in zip(missing, fetch_products([product_ids[i] for i in missing])):
+            if product is not None:
+                found[keys[index]] = product
+            elif status_code == 404:
+                not_found[keys[index]] = PRODUCT_NOT_FOUND
+            elif status_code is None:
+                failed.append(index)
+
+            products[index] = product
+
+        if found:
+            cache.set_many(found, int(app.config['PRODUCT_CACHE_TIMEOUT']))
+
+        if not_found:
+            cache.set_many(not_found, int(app.config['PRODUCT_NOT_FOUND_CACHE_TIMEOUT']))
+
+        if failed:
+            snapshots = get_snapshot_products([product_ids[index] for index in failed])
+
+            for index in failed:
+                products[index] = snapshots.get(str(product_ids[index]))
+
+            unavailable = [product_ids[index] for index in failed if products[index] is None]
+
+            if unavailable:
+                raise ProductAPIUnavailable(unavailable, products)
+
+    return [None if product == PRODUCT_NOT_FOUND else product for product in products]
@@ -0,0 +1,191 @@
+import math
+import threading
+import time
+
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app as app
+from flask import g, jsonify, make_response
+from redis import RedisError, WatchError
+from api import cache, metrics
+
+_lock = threading.Lock()
+_limiter = None
+
+
+class MemoryRateLimiter:
+    """Token buckets and in-flight counters kept in this process, for at most max_clients buckets (LRU)."""
+
+    def __init__(self, max_clients):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Take a token from the bucket of key; return 0 if there was one, else the seconds until there is."""
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+
+        return wait
+
+    def acquire(self, key, limit):
+        with self._lock:
+            count = self._in_flight.get(key, 0)
+
+            if count >= limit:
+                return False
+
+            self._in_flight[key] = count + 1
+            return True
+
+    def release(self, key):
+        with self._lock:
+            count = self._in_flight.pop(key, 0) - 1
+
+            if count > 0:
+                self._in_flight[key] = count
+
+
+class SharedRateLimiter:
+    """The same limits kept in the redis cache backend, so they hold across every worker.
+
+    Buckets are read and written in WATCH/MULTI transactions, retried up to transaction_retries times when another
+    worker changed them in between; past that the WatchError is raised, and rate_limited lets the request through as
+    for any other redis error. In-flight counters expire after in_flight_timeout seconds without requests, so the slots
+    of a killed worker are given back eventually.
+    """
+
+    def __init__(self, client, in_flight_timeout, transaction_retries=5):
+        self.client = client
+        self.in_flight_timeout = in_flight_timeout
+        self.transaction_retries = transaction_retries
+
+    def take(self, key, rate, burst):
+        key = f'rate_limit_bucket_{key}'
+
+        with self.client.pipeline() as pipe:
+            for attempt in range(self.transaction_retries + 1):
+                try:
+                    pipe.watch(key)
+                    now = time.time()
+                    state = pipe.get(key)
+                    tokens, updated = map(float, state.split()) if state else (burst, now)
+                    tokens = min(burst, tokens + max(now - updated, 0) * rate)
+                    wait = 0 if tokens >= 1 else (1 - tokens) / rate
+                    pipe.multi()
+                    pipe.set(key, f'{tokens - 1 if not wait else tokens} {now}', ex=math.ceil(burst / rate) + 1)
+                    pipe.execute()
+                    return wait
+                except WatchError:
+                    if attempt == self.transaction_retries:
+                        raise
+
+    def acquire(self, key, limit):
+        key = f'rate_limit_in_flight_{key}'
+        count, _ = self.client.pipeline().incr(key).expire(key, self.in_flight_timeout).execute()
+
+        if count > limit:
+            self.client.decr(key)
+            return False
+
+        return True
+
+    def release(self, key):
+        self.client.decr(f'rate_limit_in_flight_{key}')
+
+
+def get_limiter():
+    global _limiter
+
+    with _lock:
+        if _limiter is None:
+            client = getattr(app.extensions['cache'][cache], '_write_client', None)
+
+            if app.config['RATE_LIMIT_STORAGE'] == 'cache' and hasattr(client, 'pipeline'):
+                _limiter = SharedRateLimiter(client, int(app.config['RATE_LIMIT_IN_FLIGHT_TIMEOUT']))
+            else:
+                if app.config['RATE_LIMIT_STORAGE'] == 'cache':
+                    app.logger.warning('RATE_LIMIT_STORAGE=cache needs the redis cache backend, '
+                                       'keeping rate limits in-process')
+
+                _limiter = MemoryRateLimiter(int(app.config['RATE_LIMIT_MAX_CLIENTS']))
+
+    return _limiter
+
+
+def release(limiter, key):
+    try:
+        limiter.release(key)
+    except RedisError as err:
+        app.logger.error(f'Exception: {err}')
+
+
+def too_many_requests(family, limit, retry_after):
+    metrics.RATE_LIMITED.inc(family, limit)
+    response = make_response(jsonify(
+        {
+            'message': 'Too many requests, try again later'
+        }), 429)
+    response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def rate_limited(family):
+    """Shed the requests of a client (the JWT user set by token_required) over the limits of a route family.
+
+    Each family has a token bucket (RATE_LIMIT_<FAMILY>_RATE requests per second, up to RATE_LIMIT_<FAMILY>_BURST at
+    once) and a cap on concurrent requests (RATE_LIMIT_<FAMILY>_IN_FLIGHT), checked before the view does any work.
+    A streamed response holds its in-flight slot until it is closed, other responses give it back when the view returns.
+    If the shared storage is unreachable, requests are let through.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            prefix = f'RATE_LIMIT_{family.upper()}'
+            rate = float(app.config[f'{prefix}_RATE'])
+            in_flight = int(app.config[f'{prefix}_IN_FLIGHT'])
+            key = f'{family}_{g.token_data.get("user")}'
+            limiter = get_limiter()
+
+            try:
+                if rate:
+                    wait = limiter.take(key, rate, float(app.config[f'{prefix}_BURST']))
+
+                    if wait:
+                        return too_many_requests(family, 'rate', wait)
+
+                if in_flight and not limiter.acquire(key, in_flight):
+                    return too_many_requests(family, 'in_flight', 1)
+            except RedisError as err:
+                app.logger.error(f'Exception: {err}')
+                return f(*args, **kwargs)
+
+            if not in_flight:
+                return f(*args, **kwargs)
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                release(limiter, key)
+                raise
+
+            if response.is_streamed:
+                response.call_on_close(lambda: release(limiter, key))
+            else:
+                release(limiter, key)
+
+            return response
+
+        return decorated
+
+    return decorator
@@ -1,8 +1,11 @@
+import uuid
 import helper
 
 from flask import Blueprint, request, jsonify, make_response
 from flask import current_app as app
 from api import cache
+from api.caching import bump_generation, clear_person_product_list_cache
+from api.ratelimit import rate_limited
 from api.routes.login import token_required
 
 cache_bp = Blueprint('cache_bp', __name__)
@@ -19,6 +22,7 @@ def ping():
 
 @cache_bp.route("/clear", methods=['POST'])
 @token_required
+@rate_limited('cache')
 def clear_cache():
     if helper.is_empty_content_length(request):
         app.logger.error(f'Exception: {request.content_type}')
@@ -35,28 +39,47 @@ def clear_cache():
             }), 415)
 
     if request.method == 'POST':
-        try:
-            cache_key = request.json['cache_key']
-        except KeyError as err:
-            app.logger.error(f'Exception: {err}')
+        cache_key = request.json.get('cache_key')
+        person_id = request.json.get('person_id')
+
+        if cache_key is None and person_id is None:
+            app.logger.error('Exception: cache_key or person_id is missing')
             return make_response(jsonify(
                 {
                     'message': 'Some parameter is missing on request'
                 }), 400)
 
-        if cache_key is None or not cache_key.strip():
-            return make_response(jsonify(
-                {
-                    'message': 'You must send cache_key value on payload and it can not be empty'
-                }), 400)
+        if person_id is not None:
+            try:
+                person_id = uuid.UUID(str(person_id))
+            except ValueError as err:
+                app.logger.error(f'Exception: {err}')
+                return make_response(jsonify(
+                    {
+                        'message': 'person_id must be a valid UUID'
+                    }), 400)
+
+            app.logger.info(f'person_id: {person_id}')
 
-        cache_key = cache_key.strip()
-        app.logger.info(f'cache_key: {cache_key}')
+        if cache_key is not None:
+            if not cache_key.strip():
+                return make_response(jsonify(
+                    {
+                        'message': 'You must send cache_key value on payload and it can not be empty'
+                    }), 400)
+
+            cache_key = cache_key.strip()
+            app.logger.info(f'cache_key: {cache_key}')
 
         try:
+            if person_id is not None:
+                clear_person_product_list_cache(person_id)
+
             if cache_key == 'all':
                 cache.clear()
-            else:
+            elif cache_key == 'person_list':
+                bump_generation('person_list')
+            elif cache_key is not None:
                 cache.delete(cache_key)
 
             return make_response(jsonify(
@@ -1,17 +1,43 @@
 import datetime
 import jwt
 
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, g, request, jsonify, make_response
 from flask import current_app as app
 from functools import wraps
+from api.lru import LRUCache
 
 login_bp = Blueprint('login_bp', __name__)
+_token_cache = None
+
+
+def get_request_token():
+    authorization = request.headers.get('Authorization', '')
+
+    if authorization[:7].lower() == 'bearer ':
+        return authorization[7:].strip()
+
+    return request.args.get('token')
+
+
+def decode_token(token):
+    global _token_cache
+
+    if _token_cache is None:
+        _token_cache = LRUCache(int(app.config['TOKEN_CACHE_SIZE']))
+
+    data = _token_cache.get(token)
+
+    if data is None:
+        data = jwt.decode(token, app.config['SECRET_KEY'])
+        _token_cache.set(token, data, data.get('exp'))
+
+    return data
 
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.args.get('token')
+        token = get_request_token()
 
         if not token:
             return make_response(jsonify(
@@ -20,7 +46,7 @@ def token_required(f):
                 }), 403)
 
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'])
+            g.token_data = decode_token(token)
         except Exception as err:
             app.logger.error(f'Exception: {err}')
             return make_response(jsonify(
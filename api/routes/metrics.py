@@ -0,0 +1,11 @@
+from flask import Blueprint, make_response
+from api import metrics
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+
+@metrics_bp.route("/metrics")
+def get_metrics():
+    response = make_response(metrics.expose(), 200)
+    response.mimetype = 'text/plain; version=0.0.4'
+    return response
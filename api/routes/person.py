@@ -1,16 +1,29 @@
 import math
+import uuid
 import helper
-import requests
 
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, Response, json, request, jsonify, make_response, stream_with_context
 from flask import current_app as app
+from sqlalchemy import and_, or_
 from api import db, cache
-from api.models import Person, PersonSchema, ProductList
+from api.database import get_cache_timeout, read_from_replica
+from api.caching import bump_generation, clear_person_product_list_cache, get_generation, get_cached_response, \
+    get_person_product_list_cache_key
+from api.catalog import get_snapshot_max_date
+from api.models import Person, Product, ProductList, person_serializer, update_product_counts
+from api.products import ProductAPIUnavailable, get_product, get_products
+from api.ratelimit import rate_limited
 from api.routes.login import token_required
+from api.transfer import ImportDataError, export_ndjson, import_ndjson
 
 person_bp = Blueprint('person_bp', __name__)
 
 
+@person_bp.before_request
+def route_reads():
+    read_from_replica(request.method in ('GET', 'HEAD'))
+
+
 @person_bp.route("/ping")
 def ping():
     return make_response(jsonify(
@@ -20,28 +33,171 @@ def ping():
         }), 200)
 
 
+def stream_person_list():
+    chunk_size = int(app.config['PERSON_STREAM_CHUNK_SIZE'])
+    query = db.session.query(*person_serializer.columns).order_by(Person.create_date, Person.id)
+
+    def generate():
+        yield '{"message": "Success", "data": {"person_list": ['
+
+        for index, row in enumerate(query.yield_per(chunk_size)):
+            yield ('' if index == 0 else ',') + '\n' + json.dumps(person_serializer.dump(row))
+
+        yield '\n]}}\n'
+
+    return Response(stream_with_context(generate()), 200, mimetype='application/json')
+
+
+@person_bp.route('/import', methods=['POST'])
+@token_required
+@rate_limited('person')
+def import_persons():
+    if not helper.is_ndjson_content(request):
+        app.logger.error(f'Exception: {request.content_type}')
+        return make_response(jsonify(
+            {
+                'message': 'Unsupported Media Type'
+            }), 415)
+
+    try:
+        stats = import_ndjson(request.stream)
+    except ImportDataError as err:
+        app.logger.error(f'Exception: {err}')
+        return make_response(jsonify(
+            {
+                'message': f'Error while importing data. {err}',
+                'data': {'imported': err.stats}
+            }), 400)
+
+    return make_response(jsonify(
+        {
+            'message': 'Success',
+            'data': {'imported': stats}
+        }), 200)
+
+
+@person_bp.route('/export')
+@token_required
+@rate_limited('person')
+def export_persons():
+    return Response(stream_with_context(export_ndjson()), 200, mimetype='application/x-ndjson')
+
+
+def load_person_list_page(cursor):
+    query = db.session.query(*person_serializer.columns)
+
+    if cursor:
+        create_date, person_id = cursor
+        query = query.filter(or_(
+            Person.create_date > create_date,
+            and_(Person.create_date == create_date, Person.id > person_id)
+        ))
+
+    items_per_page = int(app.config['ITEMS_PER_PAGE'])
+    person_list = query.order_by(Person.create_date, Person.id).limit(items_per_page + 1).all()
+    next_cursor = None
+
+    if len(person_list) > items_per_page:
+        person_list = person_list[:items_per_page]
+        next_cursor = helper.encode_cursor(person_list[-1].create_date, person_list[-1].id)
+
+    return {
+        'message': 'Success',
+        'data': {'person_list': person_serializer.dump_many(person_list), 'next_cursor': next_cursor}
+    }, 200
+
+
+def get_person_cache_key(person_id):
+    return f'person_data_{person_id}'
+
+
+def get_person_response_cache_key(person_id):
+    return f'person_response_{person_id}'
+
+
+def get_persons(person_ids):
+    """Return the serialized persons for person_ids, in order, with None for persons that do not exist.
+
+    Persons are read from the per-person cache first and the missing ones are loaded with a single IN query.
+    """
+    keys = [get_person_cache_key(person_id) for person_id in person_ids]
+    persons = list(cache.get_many(*keys))
+    missing = [index for index, person in enumerate(persons) if person is None]
+
+    if missing:
+        rows = db.session.query(*person_serializer.columns).filter(Person.id.in_([person_ids[i] for i in missing]))
+        loaded = {row.id: person_serializer.dump(row) for row in rows}
+        found = {}
+
+        for index in missing:
+            persons[index] = loaded.get(person_ids[index])
+
+            if persons[index] is not None:
+                found[keys[index]] = persons[index]
+
+        if found:
+            cache.set_many(found, get_cache_timeout(app, helper.get_hours_in_seconds(1)))
+
+    return persons
+
+
+def get_person_batch():
+    try:
+        person_ids = list(dict.fromkeys(uuid.UUID(person_id) for person_id in request.args['ids'].split(',') if person_id))
+    except ValueError as err:
+        app.logger.error(f'Exception: {err}')
+        return make_response(jsonify(
+            {
+                'message': 'Some parameter is on incorrect format'
+            }), 400)
+
+    max_items = int(app.config['BATCH_MAX_ITEMS'])
+
+    if not person_ids or len(person_ids) > max_items:
+        return make_response(jsonify(
+            {
+                'message': f'ids must have between 1 and {max_items} items'
+            }), 400)
+
+    persons = get_persons(person_ids)
+
+    return make_response(jsonify(
+        {
+            'message': 'Success',
+            'data': {
+                'person_list': [person for person in persons if person is not None],
+                'missing': [person_id for person_id, person in zip(person_ids, persons) if person is None]
+            }
+        }), 200)
+
+
 @person_bp.route('/', methods=['GET', 'POST'])
 @token_required
+@rate_limited('person')
 def person():
     if request.method == 'GET':
-        person_list = cache.get('person_list')
+        if request.args.get('stream') == 'true':
+            return stream_person_list()
 
-        if person_list is not None:
-            return make_response(jsonify(
-                {
-                    'message': 'Success',
-                    'data': {'person_list': person_list}
-                }), 200)
+        if 'ids' in request.args:
+            return get_person_batch()
 
-        person_list = Person.query.order_by(Person.create_date).all()
-        schema = PersonSchema(many=True)
-        result = schema.dump(person_list)
-        cache.set('person_list', result, helper.get_hours_in_seconds(1))
-        return make_response(jsonify(
-            {
-                'message': 'Success',
-                'data': {'person_list': result}
-            }), 200)
+        after = request.args.get('after')
+        cursor = None
+
+        if after:
+            try:
+                cursor = helper.decode_cursor(after)
+            except ValueError as err:
+                app.logger.error(f'Exception: {err}')
+                return make_response(jsonify(
+                    {
+                        'message': 'Some parameter is on incorrect format'
+                    }), 400)
+
+        return get_cached_response(f'person_list_{get_generation("person_list")}_{after or "first"}',
+                                   lambda: load_person_list_page(cursor),
+                                   helper.get_hours_in_seconds(1))
 
     if request.method == 'POST':
         if helper.is_empty_content_length(request):
@@ -79,7 +235,7 @@ def person():
                     'message': 'Name or email is missing.'
                 }), 200)
 
-        cache.delete('person_list')
+        bump_generation('person_list')
 
         return make_response(jsonify(
             {
@@ -88,23 +244,23 @@ def person():
             }), 200)
 
 
+def load_person(person_id):
+    person = get_persons([person_id])[0]
+    return {
+        'message': 'Success',
+        'data': {'person': person if person is not None else {}}
+    }, 200
+
+
 @person_bp.route('/<uuid:person_id>', endpoint='getById', methods=['GET', 'PUT', 'PATCH', 'DELETE'])
 @token_required
+@rate_limited('person')
 def person(person_id):
-    _person = cache.get(f'person_{person_id}')
-
-    if _person is None:
-        _person = Person.query.get(person_id)
-
     if request.method == 'GET':
-        schema = PersonSchema()
-        result = schema.dump(_person)
-        cache.set(f'person_{person_id}', result, helper.get_hours_in_seconds(1))
-        return make_response(jsonify(
-            {
-                'message': 'Success',
-                'data': {'person': result}
-            }), 200)
+        return get_cached_response(get_person_response_cache_key(person_id), lambda: load_person(person_id),
+                                   helper.get_hours_in_seconds(1))
+
+    _person = Person.query.get(person_id)
 
     if helper.is_empty_content_length(request):
         app.logger.error(f'Exception: {request.content_type}')
@@ -133,8 +289,8 @@ def person(person_id):
 
         try:
             db.session.commit()
-            cache.delete(f'person_{person_id}')
-            cache.delete('person_list')
+            cache.delete_many(get_person_response_cache_key(person_id), get_person_cache_key(person_id))
+            bump_generation('person_list')
             return make_response(jsonify(
                 {
                     'message': 'Success',
@@ -154,8 +310,8 @@ def person(person_id):
 
         try:
             db.session.commit()
-            cache.delete(f'person_{person_id}')
-            cache.delete('person_list')
+            cache.delete_many(get_person_response_cache_key(person_id), get_person_cache_key(person_id))
+            bump_generation('person_list')
             return make_response(jsonify(
                 {
                     'message': 'Success',
@@ -180,8 +336,8 @@ def person(person_id):
         try:
             db.session.delete(_person)
             db.session.commit()
-            cache.delete(f'person_{person_id}')
-            cache.delete('person_list')
+            cache.delete_many(get_person_response_cache_key(person_id), get_person_cache_key(person_id))
+            bump_generation('person_list')
             return make_response(jsonify(
                 {
                     'message': 'Success',
@@ -196,10 +352,149 @@ def person(person_id):
                 }), 500)
 
 
+def query_person_product_list(person_id):
+    """Wishlist rows joined with the local product snapshot; snapshot columns are None when it is missing or stale."""
+    fresh = and_(Product.id == ProductList.product_id, Product.sync_date >= get_snapshot_max_date())
+    return db.session.query(ProductList.product_id, ProductList.insert_date, Product.title, Product.image,
+                            Product.price, Product.review_score) \
+        .outerjoin(Product, fresh) \
+        .filter(ProductList.person_id == person_id)
+
+
+def build_product_list(products):
+    snapshots = {product.product_id: {
+        'id': product.product_id,
+        'title': product.title,
+        'image': product.image,
+        'price': product.price,
+        'review_score': product.review_score
+    } for product in products if product.title is not None}
+    missing = [product.product_id for product in products if product.title is None]
+    unavailable = set()
+
+    try:
+        snapshots.update(zip(missing, get_products(missing)))
+    except ProductAPIUnavailable as err:
+        app.logger.warning(f'Serving partial product list: {err}')
+        snapshots.update(zip(missing, err.products))
+        unavailable.update(err.product_ids)
+
+    product_list = []
+    not_found = []
+
+    for product in products:
+        if snapshots[product.product_id] is not None:
+            product_list.append(snapshots[product.product_id])
+        elif product.product_id in unavailable:
+            product_list.append({'id': product.product_id, 'unavailable': True})
+        else:
+            not_found.append(product.product_id)
+
+    if not_found:
+        app.logger.info('%d products not found: %s', len(not_found), ', '.join(map(str, not_found)))
+
+    app.logger.debug('%d products on list, %d served from snapshot', len(product_list), len(products) - len(missing))
+    return product_list
+
+
+def get_product_list_body(data):
+    """Success body of a product list page, flagged as degraded when some products could not be looked up."""
+    body = {'message': 'Success', 'data': data}
+
+    if any(product.get('unavailable') for product in data['product_list']):
+        body['degraded'] = True
+
+    return body
+
+
+def load_person_product_list_after(person_id, after, cursor):
+    items_per_page = int(app.config['ITEMS_PER_PAGE'])
+    query = query_person_product_list(person_id)
+
+    if cursor:
+        insert_date, product_id = cursor
+        query = query.filter(or_(
+            ProductList.insert_date > insert_date,
+            and_(ProductList.insert_date == insert_date, ProductList.product_id > product_id)
+        ))
+
+    products = query.order_by(ProductList.insert_date, ProductList.product_id).limit(items_per_page + 1).all()
+
+    if not products and not after:
+        return {
+            'message': 'This product list is empty',
+            'data': {'person_id': person_id}
+        }, 200
+
+    next_cursor = None
+
+    if len(products) > items_per_page:
+        products = products[:items_per_page]
+        next_cursor = helper.encode_cursor(products[-1].insert_date, products[-1].product_id)
+
+    return get_product_list_body(
+        {'person_id': person_id, 'product_list': build_product_list(products), 'next_cursor': next_cursor}), 200
+
+
+def get_person_product_list_after(person_id):
+    after = request.args.get('after')
+    cursor = None
+
+    if after:
+        try:
+            cursor = helper.decode_cursor(after)
+        except ValueError as err:
+            app.logger.error(f'Exception: {err}')
+            return make_response(jsonify(
+                {
+                    'message': 'Some parameter is on incorrect format',
+                    'data': {'person_id': person_id}
+                }), 400)
+
+    return get_cached_response(get_person_product_list_cache_key(person_id, f'after_{after or "first"}'),
+                               lambda: load_person_product_list_after(person_id, after, cursor),
+                               helper.get_hours_in_seconds(1))
+
+
+def load_person_product_list_page(person_id, page):
+    product_count = db.session.query(Person.product_count).filter(Person.id == person_id).scalar() or 0
+
+    if product_count <= 0:
+        return {
+            'message': 'This product list is empty',
+            'data': {'person_id': person_id}
+        }, 200
+
+    items_per_page = int(app.config['ITEMS_PER_PAGE'])
+    max_page = math.ceil(product_count / items_per_page)
+
+    if page > max_page:
+        return {
+            'message': f'Page number must be less than or equal to {max_page}',
+            'data': {'product_count': product_count}
+        }, 404
+
+    # max_page already comes from product_count, so the page is read without paginate() and its COUNT query.
+    products = query_person_product_list(person_id).order_by(ProductList.insert_date, ProductList.product_id) \
+        .limit(items_per_page).offset((page - 1) * items_per_page).all()
+
+    if products:
+        return get_product_list_body({'person_id': person_id, 'product_list': build_product_list(products)}), 200
+
+    return {
+        'message': 'This product list is empty',
+        'data': {'person_id': person_id}
+    }, 200
+
+
 @person_bp.route('/<uuid:person_id>/product', methods=['GET', 'POST'])
 @token_required
+@rate_limited('product')
 def get_person_product_list(person_id):
     if request.method == 'GET':
+        if 'page' not in request.args:
+            return get_person_product_list_after(person_id)
+
         try:
             page = int(request.args.get('page')) or 1
         except ValueError as err:
@@ -219,90 +514,33 @@ def get_person_product_list(person_id):
 
         app.logger.debug(f'page: {page}')
 
-        product_list = cache.get(f'products_person_{person_id}_page_{page}')
-
-        if product_list is not None:
-            return make_response(jsonify(
-                {
-                    'message': 'Success',
-                    'data': {'person_id': person_id, 'product_list': product_list}
-                }), 200)
-
-        product_count = ProductList.query.filter(ProductList.person_id == person_id).count()
-
-        if product_count <= 0:
-            return make_response(jsonify(
-                {
-                    'message': 'This product list is empty',
-                    'data': {'person_id': person_id}
-                }), 200)
-
-        items_per_page = int(app.config['ITEMS_PER_PAGE'])
-        max_page = math.ceil(product_count / items_per_page)
-
-        if page > max_page:
-            return make_response(jsonify(
-                {
-                    'message': f'Page number must be less than or equal to {max_page}',
-                    'data': {'product_count': product_count}
-                }), 404)
-
-        products = ProductList.query.filter(ProductList.person_id == person_id).group_by(ProductList.insert_date).paginate(page, items_per_page, True).items
-
-        if products:
-            product_list = []
-            product_api_endpoint = app.config['EXTERNAL_API']
-
-            for product in products:
-                response = requests.get(product_api_endpoint.replace('|PRODUCT_ID|', str(product.product_id)))
-
-                if response.status_code == 200:
-                    p = response.json()
-                    title = p['title']
-                    image = p['image']
-                    price = p['price']
-                    review_score = p['reviewScore'] if 'reviewScore' in p else None
-
-                    product_list.append(
-                        {
-                            'id': product.product_id,
-                            'title': title,
-                            'image': image,
-                            'price': price,
-                            'review_score': review_score
-                        }
-                    )
-                else:
-                    app.logger.info(f'Product ({product.product_id}) not found')
-
-            app.logger.debug(f'{len(product_list)} products on list')
-            cache.set(f'products_person_{person_id}_page_{page}', product_list, helper.get_hours_in_seconds(1))
-            return make_response(jsonify(
-                {
-                    'message': 'Success',
-                    'data': {'person_id': person_id, 'product_list': product_list}
-                }), 200)
-
-        return make_response(jsonify(
-            {
-                'message': 'This product list is empty',
-                'data': {'person_id': person_id}
-            }), 200)
+        return get_cached_response(get_person_product_list_cache_key(person_id, page),
+                                   lambda: load_person_product_list_page(person_id, page),
+                                   helper.get_hours_in_seconds(1))
 
     if request.method == 'POST':
         product_id = request.json['product_id']
         app.logger.info(f'product_id: {product_id}')
-        product_api_endpoint = app.config['EXTERNAL_API']
-        response = requests.get(product_api_endpoint.replace('|PRODUCT_ID|', str(product_id)))
 
-        if not response.status_code == 200:
+        try:
+            product = get_product(product_id)
+        except ProductAPIUnavailable as err:
+            app.logger.error(f'Exception: {err}')
+            return make_response(jsonify(
+                {
+                    'message': 'Product service is unavailable, try again later',
+                    'data': {'product_id': product_id}
+                }), 503)
+
+        if product is None:
             return make_response(jsonify(
                 {
                     'message': 'This product does not exists',
                     'data': {'product_id': product_id}
                 }), 404)
 
-        _product = ProductList.query.filter(ProductList.person_id == person_id, ProductList.product_id == product_id).count()
+        _product = db.session.query(ProductList.query.filter(ProductList.person_id == person_id,
+                                                             ProductList.product_id == product_id).exists()).scalar()
 
         if _product:
             return make_response(jsonify(
@@ -315,25 +553,18 @@ def get_person_product_list(person_id):
 
         try:
             db.session.add(_product)
+            update_product_counts({person_id: 1})
             db.session.commit()
         except Exception as err:
             app.logger.error(f'Exception: {err}')
+            db.session.rollback()
             return make_response(jsonify(
                 {
                     'message': f'Error while adding product (\'{product_id}\') to person (\'{person_id}\'',
                     'data': {'person_id': person_id, 'product_id': product_id}
                 }), 500)
 
-        product_count = ProductList.query.filter(ProductList.person_id == person_id).count()
-        items_per_page = int(app.config['ITEMS_PER_PAGE'])
-
-        if items_per_page > 0:
-            max_page = math.ceil(product_count / items_per_page)
-
-            if max_page > 0:
-                for page in range(1, max_page + 1):
-                    app.logger.debug(f'Deleting cache key: products_person_{person_id}_page_{page}')
-                    cache.delete(f'products_person_{person_id}_page_{page}')
+        clear_person_product_list_cache(person_id)
 
         return make_response(jsonify(
             {
@@ -343,6 +574,7 @@ def get_person_product_list(person_id):
 
 @person_bp.route('/<uuid:person_id>/product', methods=['DELETE'])
 @token_required
+@rate_limited('product')
 def delete_product(person_id):
     if helper.is_empty_content_length(request):
         app.logger.error(f'Exception: {request.content_type}')
@@ -372,22 +604,10 @@ def delete_product(person_id):
     if _product:
         try:
             db.session.delete(_product)
+            update_product_counts({person_id: -1})
             db.session.commit()
 
-            product_count = ProductList.query.filter(ProductList.person_id == person_id).count()
-
-            if product_count == 0:
-                cache.delete(f'products_person_{person_id}_page_1')
-            else:
-                items_per_page = int(app.config['ITEMS_PER_PAGE'])
-
-                if items_per_page > 0:
-                    max_page = math.ceil(product_count / items_per_page)
-
-                    if max_page > 0:
-                        for page in range(1, max_page + 1):
-                            app.logger.debug(f'Deleting cache key: products_person_{person_id}_page_{page}')
-                            cache.delete(f'products_person_{person_id}_page_{page}')
+            clear_person_product_list_cache(person_id)
 
             return make_response(jsonify(
                 {
@@ -400,4 +620,129 @@ def delete_product(person_id):
                 {
                     'message': 'Error while deleting product from list',
                     'data': {'person_id': person_id, 'product_id': product_id}
-                }), 500)
\ No newline at end of file
+                }), 500)
+
+
+@person_bp.route('/<uuid:person_id>/product/batch', methods=['POST'])
+@token_required
+@rate_limited('product')
+def batch_products(person_id):
+    if helper.is_empty_content_length(request):
+        app.logger.error(f'Exception: {request.content_type}')
+        return make_response(jsonify(
+            {
+                'message': 'Payload can not be empty'
+            }), 411)
+
+    if not helper.is_json_content(request):
+        app.logger.error(f'Exception: {request.content_type}')
+        return make_response(jsonify(
+            {
+                'message': 'Unsupported Media Type'
+            }), 415)
+
+    add = request.json.get('add') or []
+    remove = request.json.get('remove') or []
+
+    if not isinstance(add, list) or not isinstance(remove, list) or not (add or remove):
+        return make_response(jsonify(
+            {
+                'message': 'You must send add and/or remove lists of product_id on payload'
+            }), 400)
+
+    batch_max_items = int(app.config['BATCH_MAX_ITEMS'])
+
+    if len(add) + len(remove) > batch_max_items:
+        return make_response(jsonify(
+            {
+                'message': f'A batch can not have more than {batch_max_items} items'
+            }), 413)
+
+    results = []
+    add_ids = []
+    remove_ids = []
+
+    for action, product_ids, valid_ids in (('add', add, add_ids), ('remove', remove, remove_ids)):
+        for product_id in product_ids:
+            try:
+                product_id = uuid.UUID(str(product_id))
+            except ValueError:
+                results.append({'product_id': product_id, 'action': action, 'status': 'invalid'})
+                continue
+
+            if product_id in valid_ids:
+                results.append({'product_id': product_id, 'action': action, 'status': 'duplicate'})
+            else:
+                valid_ids.append(product_id)
+                results.append({'product_id': product_id, 'action': action, 'status': None})
+
+    existing = set()
+
+    if add_ids or remove_ids:
+        existing = {product.product_id for product in ProductList.query.filter(
+            ProductList.person_id == person_id,
+            ProductList.product_id.in_(add_ids + remove_ids)
+        )}
+
+    new_ids = [product_id for product_id in add_ids if product_id not in existing]
+
+    try:
+        products = get_products(new_ids)
+    except ProductAPIUnavailable as err:
+        app.logger.error(f'Exception: {err}')
+        return make_response(jsonify(
+            {
+                'message': 'Product service is unavailable, try again later',
+                'data': {'person_id': person_id, 'product_ids': err.product_ids}
+            }), 503)
+
+    found = {product_id for product_id, product in zip(new_ids, products) if product is not None}
+    removed = {product_id for product_id in remove_ids if product_id in existing}
+
+    for result in results:
+        if result['status'] is not None:
+            continue
+
+        product_id = result['product_id']
+
+        if result['action'] == 'add':
+            if product_id in existing:
+                result['status'] = 'already_in_list'
+            elif product_id in found:
+                result['status'] = 'added'
+            else:
+                result['status'] = 'not_found'
+        else:
+            result['status'] = 'removed' if product_id in removed else 'not_in_list'
+
+    if found or removed:
+        try:
+            if found:
+                db.session.bulk_insert_mappings(ProductList, [
+                    {'person_id': person_id, 'product_id': product_id} for product_id in add_ids if product_id in found
+                ])
+
+            if removed:
+                ProductList.query.filter(
+                    ProductList.person_id == person_id,
+                    ProductList.product_id.in_(list(removed))
+                ).delete(synchronize_session=False)
+
+            update_product_counts({person_id: len(found) - len(removed)})
+            db.session.commit()
+        except Exception as err:
+            app.logger.error(f'Exception: {err}')
+            db.session.rollback()
+            return make_response(jsonify(
+                {
+                    'message': 'Error while updating product list',
+                    'data': {'person_id': person_id}
+                }), 500)
+
+        clear_person_product_list_cache(person_id)
+
+    return make_response(jsonify(
+        {
+            'message': 'Success',
+            'data': {'person_id': person_id, 'results': results}
+        }), 200)
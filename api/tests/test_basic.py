@@ -1,8 +1,14 @@
 import base64
+import datetime
+import gzip
 import json
 import unittest
+import uuid
 
-from api import create_app, db
+from sqlalchemy import event
+from api import create_app, db, cache, metrics
+from api.models import Person, PersonSchema, ProductList, person_serializer
+from api.products import get_product_cache_key
 from api.routes.login import login_bp
 from api.routes.person import person_bp
 
@@ -30,6 +36,7 @@ class BasicTests(unittest.TestCase):
         self.api_token = self.login()
         db.drop_all()
         db.create_all()
+        cache.clear()
 
     def test_login(self):
         response = self.app.get('/login/', headers={'Authorization': 'Basic ' + self.valid_credentials})
@@ -37,6 +44,26 @@ class BasicTests(unittest.TestCase):
         self.api_token = response.json['data']['token']
         self.assertEqual(response.status_code, 200)
 
+    def test_bearer_token(self):
+        response = self.app.get('/person/', headers={'Authorization': 'Bearer ' + self.api_token})
+        self.assertEqual(response.status_code, 200)
+        response = self.app.get('/person/', headers={'Authorization': 'Bearer invalid'})
+        self.assertEqual(response.status_code, 403)
+        response = self.app.get('/person/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics(self):
+        self.app.get('/person/?token=' + self.api_token)
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.data.decode('utf-8')
+        self.assertIn('http_request_duration_seconds_count{endpoint="person_bp.person",method="GET",status="200"}', body)
+        self.assertIn('db_queries_total', body)
+        self.assertIn('http_request_db_queries_count{endpoint="person_bp.person"}', body)
+        self.assertIn('http_request_db_duration_seconds_sum{endpoint="person_bp.person"}', body)
+        self.assertIn('http_request_external_api_calls_bucket{endpoint="person_bp.person",le="0"}', body)
+        self.assertIn('cache_operations_total{family="person_list",result="miss"}', body)
+
     def test_get_person_list(self):
         response = self.app.get('/person/?token=' + self.api_token)
         self.assertEqual(response.status_code, 200)
@@ -62,6 +89,247 @@ class BasicTests(unittest.TestCase):
         person_list = response.json['data']['person_list']
         assert len(person_list) != 0, "Empty list"
 
+    def test_get_person_etag(self):
+        response = self.app.post(
+            '/person/?token=' + self.api_token,
+            data=json.dumps(dict(name='Bruno 01', email='bruno01@teste.com')),
+            content_type='application/json'
+        )
+        person_id = response.json["data"]["person_id"]
+        url = f'/person/{person_id}?token={self.api_token}'
+        cache.set(f'person_{person_id}', {'id': person_id, 'name': 'Cached by an older release'})
+        response = self.app.get(url)
+        etag = response.headers['ETag']
+        self.assertEqual(response.json['data']['person']['name'], 'Bruno 01')
+
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        # If-None-Match uses the weak comparison, so ETags weakened by a proxy still match.
+        self.assertEqual(self.app.get(url, headers={'If-None-Match': f'W/{etag}'}).status_code, 304)
+
+        self.app.patch(url, data=json.dumps(dict(name='Bruno 02')), content_type='application/json')
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['data']['person']['name'], 'Bruno 02')
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def add_persons(self, count):
+        for i in range(count):
+            db.session.add(Person(name=f'Person {i}', email=f'person{i}@teste.com'))
+
+        db.session.commit()
+
+    def test_get_person_list_cursor(self):
+        app.config['ITEMS_PER_PAGE'] = 10
+        self.add_persons(25)
+        url = f'/person/?token={self.api_token}'
+        pages = [self.app.get(url).json['data']]
+
+        while pages[-1]['next_cursor'] is not None:
+            pages.append(self.app.get(f'{url}&after={pages[-1]["next_cursor"]}').json['data'])
+
+        self.assertEqual([len(page['person_list']) for page in pages], [10, 10, 5])
+        self.assertEqual(len({person['id'] for page in pages for person in page['person_list']}), 25)
+
+        self.app.post(url, data=json.dumps(dict(name='Bruno 01', email='bruno01@teste.com')),
+                      content_type='application/json')
+        response = self.app.get(f'{url}&after={pages[-2]["next_cursor"]}')
+        self.assertEqual(len(response.json['data']['person_list']), 6)
+
+    def test_get_person_batch(self):
+        self.add_persons(5)
+        person_ids = [str(person.id) for person in Person.query.order_by(Person.email)]
+        unknown_id = str(uuid.uuid4())
+        requested = [person_ids[3], unknown_id, person_ids[0], person_ids[3]]
+        url = f'/person/?token={self.api_token}&ids={",".join(requested)}'
+
+        self.app.get(f'/person/{person_ids[0]}?token={self.api_token}')
+        data = self.app.get(url).json['data']
+        self.assertEqual([person['id'] for person in data['person_list']], [person_ids[3], person_ids[0]])
+        self.assertEqual(data['missing'], [unknown_id])
+
+        hits = metrics.CACHE_OPERATIONS.value('person', 'hit') + metrics.CACHE_L1_OPERATIONS.value('person', 'hit')
+        self.assertEqual(self.app.get(url).json['data'], data)
+        self.assertEqual(metrics.CACHE_OPERATIONS.value('person', 'hit') +
+                         metrics.CACHE_L1_OPERATIONS.value('person', 'hit'), hits + 2)
+
+        self.app.put(f'/person/{person_ids[0]}?token={self.api_token}', content_type='application/json',
+                     data=json.dumps({'name': 'Renamed', 'email': 'renamed@teste.com'}))
+        self.assertEqual(self.app.get(url).json['data']['person_list'][1]['name'], 'Renamed')
+
+        response = self.app.get(f'/person/?token={self.api_token}&ids=invalid')
+        self.assertEqual(response.status_code, 400)
+
+    def test_person_serializer_matches_schema(self):
+        self.add_persons(5)
+        rows = db.session.query(*person_serializer.columns).order_by(Person.create_date, Person.id).all()
+        persons = Person.query.order_by(Person.create_date, Person.id).all()
+        self.assertEqual(json.dumps(person_serializer.dump_many(rows)), json.dumps(PersonSchema(many=True).dump(persons)))
+
+    def test_get_person_list_gzip(self):
+        app.config['ITEMS_PER_PAGE'] = 25
+        self.add_persons(25)
+        url = f'/person/?token={self.api_token}'
+        plain = self.app.get(url)
+        compressed = self.app.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+        self.assertLess(len(compressed.data), len(plain.data))
+
+        etag = plain.headers['ETag']
+        self.assertEqual(compressed.headers['ETag'], etag[:-1] + '-gzip"')
+
+        for headers in ({'If-None-Match': etag, 'Accept-Encoding': 'gzip'}, {'If-None-Match': compressed.headers['ETag']}):
+            self.assertEqual(self.app.get(url, headers=headers).status_code, 304)
+
+    def test_get_person_list_stream(self):
+        self.add_persons(25)
+        response = self.app.get(f'/person/?token={self.api_token}&stream=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.data)['data']['person_list']), 25)
+
+    def test_import_export_ndjson(self):
+        person_id = str(uuid.uuid4())
+        lines = [
+            json.dumps(dict(type='person', id=person_id, name='Bruno 03', email='bruno03@teste.com')),
+            json.dumps(dict(type='product', person_id=person_id, product_id=str(uuid.uuid4()))),
+            json.dumps(dict(type='product', person_id=person_id, product_id=str(uuid.uuid4())))
+        ]
+        response = self.app.post(f'/person/import?token={self.api_token}', data='\n'.join(lines),
+                                 content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['data']['imported'], {'person': 1, 'product': 2})
+
+        response = self.app.get(f'/person/export?token={self.api_token}')
+        rows = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        self.assertEqual([row['type'] for row in rows], ['person', 'product', 'product'])
+        self.assertEqual(rows[0]['id'], person_id)
+
+        for data in ('{"type": "unknown"}', '[1]', '"x"'):
+            response = self.app.post(f'/person/import?token={self.api_token}', data=data,
+                                     content_type='application/x-ndjson')
+            self.assertEqual(response.status_code, 400)
+
+    def add_products(self, count):
+        person = Person(name='Bruno 02', email='bruno02@teste.com', product_count=count)
+        db.session.add(person)
+        db.session.commit()
+
+        insert_date = datetime.datetime.utcnow()
+        product_ids = [uuid.uuid4() for _ in range(count)]
+
+        for product_id in product_ids:
+            db.session.add(ProductList(person_id=person.id, product_id=product_id, insert_date=insert_date))
+            cache.set(get_product_cache_key(product_id), {'id': product_id, 'title': 'Product', 'image': None,
+                                                          'price': 1.0, 'review_score': None})
+
+        db.session.commit()
+        return person.id, sorted(str(product_id) for product_id in product_ids)
+
+    def test_get_person_product_list_cursor(self):
+        app.config['ITEMS_PER_PAGE'] = 10
+        person_id, product_ids = self.add_products(25)
+        url = f'/person/{person_id}/product?token={self.api_token}'
+        seen = []
+
+        response = self.app.get(url)
+
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(product['id'] for product in response.json['data']['product_list'])
+            next_cursor = response.json['data']['next_cursor']
+
+            if next_cursor is None:
+                break
+
+            response = self.app.get(f'{url}&after={next_cursor}')
+
+        self.assertEqual(seen, product_ids)
+
+    def test_batch_products(self):
+        person_id, product_ids = self.add_products(3)
+        new_id = uuid.uuid4()
+        cache.set(get_product_cache_key(new_id), {'id': new_id, 'title': 'Product', 'image': None, 'price': 1.0,
+                                                  'review_score': None})
+        response = self.app.post(
+            f'/person/{person_id}/product/batch?token={self.api_token}',
+            data=json.dumps(dict(add=[str(new_id), product_ids[0], 'invalid', str(new_id)],
+                                 remove=[product_ids[1], str(uuid.uuid4())])),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        statuses = [result['status'] for result in response.json['data']['results']]
+        self.assertEqual(statuses, ['added', 'already_in_list', 'invalid', 'duplicate', 'removed', 'not_in_list'])
+        self.assertEqual(ProductList.query.filter(ProductList.person_id == person_id).count(), 3)
+
+    def test_product_count(self):
+        app.config['ITEMS_PER_PAGE'] = 10
+        person_id, product_ids = self.add_products(3)
+        new_id = uuid.uuid4()
+        cache.set(get_product_cache_key(new_id), {'id': new_id, 'title': 'Product', 'image': None, 'price': 1.0,
+                                                  'review_score': None})
+        url = f'/person/{person_id}/product?token={self.api_token}'
+
+        for _ in range(2):
+            self.app.post(url, data=json.dumps(dict(product_id=str(new_id))), content_type='application/json')
+
+        self.app.delete(url, data=json.dumps(dict(product_id=product_ids[0])), content_type='application/json')
+        self.app.post(f'/person/{person_id}/product/batch?token={self.api_token}', content_type='application/json',
+                      data=json.dumps(dict(remove=[product_ids[1], product_ids[1]])))
+
+        self.assertEqual(Person.query.get(person_id).product_count, 2)
+        self.assertEqual(self.app.get(f'{url}&page=2').status_code, 404)
+
+        Person.query.filter(Person.id == person_id).update({Person.product_count: 10})
+        db.session.commit()
+        result = app.test_cli_runner().invoke(args=['repair-product-counts'])
+        self.assertIn('Repaired the product count of 1 persons', result.output)
+        self.assertEqual(Person.query.get(person_id).product_count, 2)
+
+    def test_product_page_skips_count(self):
+        app.config['ITEMS_PER_PAGE'] = 10
+        person_id, _ = self.add_products(25)
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.lower())
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+
+        try:
+            response = self.app.get(f'/person/{person_id}/product?token={self.api_token}&page=2')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        self.assertEqual(len(response.json['data']['product_list']), 10)
+        self.assertFalse([statement for statement in statements if 'count(' in statement])
+        self.assertEqual(len(statements), 2)
+
+    def test_clear_person_product_list_cache(self):
+        app.config['ITEMS_PER_PAGE'] = 10
+        person_id, _ = self.add_products(3)
+        url = f'/person/{person_id}/product?token={self.api_token}'
+        self.assertEqual(len(self.app.get(url).json['data']['product_list']), 3)
+
+        product_id = uuid.uuid4()
+        cache.set(get_product_cache_key(product_id), {'id': product_id, 'title': 'Product', 'image': None,
+                                                      'price': 1.0, 'review_score': None})
+        db.session.add(ProductList(person_id=person_id, product_id=product_id))
+        db.session.commit()
+        self.assertEqual(len(self.app.get(url).json['data']['product_list']), 3)
+
+        response = self.app.post(f'/cache/clear?token={self.api_token}', data=json.dumps(dict(person_id=str(person_id))),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.app.get(url).json['data']['product_list']), 4)
+
+    def test_get_person_product_list_invalid_cursor(self):
+        person_id, _ = self.add_products(1)
+        response = self.app.get(f'/person/{person_id}/product?token={self.api_token}&after=invalid')
+        self.assertEqual(response.status_code, 400)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,220 @@
+import threading
+import time
+import unittest
+
+from flask import Flask
+from api import InstrumentedCache, create_app, cache, metrics
+from api.caching import bump_generation, get_generation, get_or_compute
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+app = create_app()
+
+
+def create_redis_cache(server):
+    """A cache bound to its own app on a fake redis server, standing in for one worker."""
+    worker_app = Flask(__name__)
+    worker_app.config.from_object('config.Config')
+    worker_app.config.update(CACHE_TYPE='redis', CACHE_REDIS_HOST=fakeredis.FakeRedis(server=server))
+    worker_cache = InstrumentedCache()
+    worker_cache.init_app(worker_app)
+    return worker_app, worker_cache
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    return condition()
+
+
+class CachingTests(unittest.TestCase):
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        cache.clear()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_bump_generation(self):
+        generation = get_generation('test')
+        self.assertEqual(get_generation('test'), generation)
+        bump_generation('test')
+        self.assertEqual(get_generation('test'), generation + 1)
+
+    def test_generation_expires(self):
+        generation_timeout = app.config['CACHE_GENERATION_TIMEOUT']
+        app.config['CACHE_GENERATION_TIMEOUT'] = 1
+
+        try:
+            generation = get_generation('expiring')
+            time.sleep(1.1)
+            self.assertGreater(get_generation('expiring'), generation)
+        finally:
+            app.config['CACHE_GENERATION_TIMEOUT'] = generation_timeout
+
+    def test_get_or_compute_single_flight(self):
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        def worker():
+            with app.app_context():
+                results.append(get_or_compute('single_flight', compute, 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 10)
+        self.assertEqual(len(calls), 1)
+
+    def test_get_or_compute_waiters_fall_back_after_lock_timeout(self):
+        lock_timeout = app.config['CACHE_LOCK_TIMEOUT']
+        app.config['CACHE_LOCK_TIMEOUT'] = 1
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(1.3)
+            return 'value'
+
+        def worker():
+            with app.app_context():
+                results.append(get_or_compute('slow_flight', compute, 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+
+        try:
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+        finally:
+            app.config['CACHE_LOCK_TIMEOUT'] = lock_timeout
+
+        self.assertEqual(results, ['value'] * 3)
+        self.assertEqual(len(calls), 3)
+
+    def test_get_or_compute_ignores_foreign_entries(self):
+        cache.set('legacy', {'id': 'written by an older release'})
+        self.assertEqual(get_or_compute('legacy', lambda: 'value', 60), 'value')
+        self.assertEqual(cache.get('legacy')['value'], 'value')
+
+    def test_get_or_compute_stale_while_revalidate(self):
+        values = iter(['old', 'new'])
+        refreshed = threading.Event()
+
+        def compute():
+            value = next(values)
+
+            if value == 'new':
+                refreshed.set()
+
+            return value
+
+        self.assertEqual(get_or_compute('stale', compute, 0, stale_timeout=60), 'old')
+        self.assertEqual(get_or_compute('stale', compute, 0, stale_timeout=60), 'old')
+        self.assertTrue(refreshed.wait(1))
+
+        for _ in range(20):
+            if cache.get('stale')['value'] == 'new':
+                break
+
+            time.sleep(0.05)
+
+        self.assertEqual(cache.get('stale')['value'], 'new')
+
+    def test_l1_serves_repeated_reads(self):
+        cache.set('person_l1', 'value')
+        hits = metrics.CACHE_L1_OPERATIONS.value('person', 'hit')
+        l2_hits = metrics.CACHE_OPERATIONS.value('person', 'hit')
+
+        for _ in range(3):
+            self.assertEqual(cache.get('person_l1'), 'value')
+
+        self.assertEqual(metrics.CACHE_L1_OPERATIONS.value('person', 'hit'), hits + 2)
+        self.assertEqual(metrics.CACHE_OPERATIONS.value('person', 'hit'), l2_hits + 1)
+
+        cache.delete('person_l1')
+        self.assertIsNone(cache.get('person_l1'))
+
+    def test_l1_skips_generation_keys(self):
+        get_generation('l1')
+        get_generation('l1')
+        self.assertIsNone(cache.l1.get('l1_generation'))
+
+    @unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+    def test_l1_invalidated_across_workers(self):
+        server = fakeredis.FakeServer()
+        app_a, cache_a = create_redis_cache(server)
+        app_b, cache_b = create_redis_cache(server)
+
+        try:
+            with app_a.app_context():
+                cache_a.set('person_shared', 'old')
+
+            with app_b.app_context():
+                self.assertEqual(cache_b.get('person_shared'), 'old')
+                self.assertEqual(cache_b.l1.get('person_shared'), 'old')
+
+            with app_a.app_context():
+                cache_a.set('person_shared', 'new')
+
+            self.assertTrue(wait_for(lambda: cache_b.l1.get('person_shared') is None))
+
+            with app_b.app_context():
+                self.assertEqual(cache_b.get('person_shared'), 'new')
+
+            with app_a.app_context():
+                cache_a.clear()
+
+            self.assertTrue(wait_for(lambda: len(cache_b.l1) == 0))
+        finally:
+            cache_a.close()
+            cache_b.close()
+
+    @unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+    def test_l1_listener_survives_malformed_messages(self):
+        server = fakeredis.FakeServer()
+        worker_app, worker_cache = create_redis_cache(server)
+        publisher = fakeredis.FakeRedis(server=server)
+
+        try:
+            with worker_app.app_context():
+                worker_cache.set('person_malformed', 'value')
+                self.assertEqual(worker_cache.get('person_malformed'), 'value')
+
+            for data in (b'\xff\xfe', b'node {not json', b'node 5'):
+                publisher.publish(worker_app.config['L1_CACHE_CHANNEL'], data)
+
+            self.assertTrue(wait_for(lambda: worker_cache.l1.get('person_malformed') is None))
+
+            with worker_app.app_context():
+                self.assertEqual(worker_cache.get('person_malformed'), 'value')
+
+            publisher.publish(worker_app.config['L1_CACHE_CHANNEL'], 'node ["person_malformed"]')
+            self.assertTrue(wait_for(lambda: worker_cache.l1.get('person_malformed') is None))
+            self.assertTrue(worker_cache._listener.is_alive())
+        finally:
+            worker_cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
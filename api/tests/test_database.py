@@ -0,0 +1,149 @@
+import base64
+import os
+import tempfile
+import time
+import unittest
+import uuid
+
+from sqlalchemy import inspect
+from sqlalchemy_utils import UUIDType
+
+from api import create_app, db, cache
+from api.caching import get_or_compute
+from api.database import read_from_replica
+from api.models import UUID_TABLES, Person, ProductList, get_uuid_storage, person_serializer
+
+app = create_app()
+
+
+class DatabaseTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        app.config['SQLALCHEMY_BINDS'] = {'replica': f'sqlite:///{os.path.join(tempfile.mkdtemp(), "replica.db")}'}
+
+    @classmethod
+    def tearDownClass(cls):
+        app.config['SQLALCHEMY_BINDS'] = None
+
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.drop_all()
+        db.create_all()
+        replica = db.get_engine(app, 'replica')
+        db.Model.metadata.drop_all(bind=replica)
+        db.Model.metadata.create_all(bind=replica)
+        cache.clear()
+
+        self.person = Person(name='Primary', email='primary@teste.com')
+        db.session.add(self.person)
+        db.session.commit()
+        self.person_id = self.person.id
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+
+    def test_create_app_opens_no_connection(self):
+        fresh_app = create_app()
+        self.assertEqual(fresh_app.extensions['sqlalchemy'].connectors, {})
+        self.assertFalse(hasattr(fresh_app, 'cache'))
+
+        result = fresh_app.test_cli_runner().invoke(args=['init-db'])
+        self.assertIn('Created missing tables', result.output)
+
+    def test_init_db_creates_missing_indexes(self):
+        db.session.remove()
+        db.engine.execute('DROP INDEX ix_productlist_person_id_insert_date_product_id')
+
+        result = app.test_cli_runner().invoke(args=['init-db'])
+        self.assertIn('Created index ix_productlist_person_id_insert_date_product_id', result.output)
+        self.assertIn('ix_productlist_person_id_insert_date_product_id',
+                      {index['name'] for index in inspect(db.engine).get_indexes('productlist')})
+
+        result = app.test_cli_runner().invoke(args=['init-db'])
+        self.assertNotIn('Created index', result.output)
+
+    def test_reads_go_to_primary_by_default(self):
+        with app.test_request_context('/person/', method='POST'):
+            self.assertIsNotNone(Person.query.get(self.person_id))
+
+    def test_reads_go_to_replica_until_first_write(self):
+        with app.test_request_context('/person/'):
+            read_from_replica()
+            self.assertIsNone(Person.query.get(self.person_id))
+
+            db.session.add(Person(name='Written', email='written@teste.com'))
+            db.session.commit()
+
+            self.assertIsNotNone(Person.query.get(self.person_id))
+            self.assertEqual(Person.query.count(), 2)
+
+    def test_person_get_reads_from_replica(self):
+        client = app.test_client()
+        credentials = base64.b64encode(f'user:{app.config["PASSWORD"]}'.encode('utf-8')).decode('utf-8')
+        token = client.get('/login/', headers={'Authorization': 'Basic ' + credentials}).json['data']['token']
+        headers = {'Authorization': 'Bearer ' + token}
+
+        self.assertEqual(client.get(f'/person/{self.person_id}', headers=headers).json['data']['person'], {})
+        response = client.put(f'/person/{self.person_id}', headers=headers, content_type='application/json',
+                              data='{"name": "Updated", "email": "updated@teste.com"}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_replica_reads_are_cached_briefly(self):
+        client = app.test_client()
+        credentials = base64.b64encode(f'user:{app.config["PASSWORD"]}'.encode('utf-8')).decode('utf-8')
+        token = client.get('/login/', headers={'Authorization': 'Basic ' + credentials}).json['data']['token']
+        client.get(f'/person/{self.person_id}', headers={'Authorization': 'Bearer ' + token})
+
+        timeout = int(app.config['DB_REPLICA_CACHE_TIMEOUT'])
+        self.assertLessEqual(cache.get(f'person_response_{self.person_id}')['fresh_until'], time.time() + timeout)
+
+        with app.test_request_context('/person/', method='POST'):
+            read_from_replica(False)
+            get_or_compute('primary_value', lambda: 'value', 3600)
+
+        self.assertGreater(cache.get('primary_value')['fresh_until'], time.time() + timeout)
+
+    def test_migrate_uuid_storage_converts_keys(self):
+        # Recreate the keyed tables as written with the other UUID_STORAGE, then migrate them to the models' storage.
+        target = app.config['UUID_STORAGE']
+        source = 'string' if target == 'binary' else 'binary'
+        product_id = uuid.uuid4()
+        before = person_serializer.dump(db.session.query(*person_serializer.columns).one())
+        rows = {table.name: [dict(row) for row in db.session.execute(table.select())] for table in UUID_TABLES}
+        rows['productlist'] = [{'person_id': self.person_id, 'product_id': product_id}]
+        db.session.remove()
+        db.drop_all()
+        source_metadata = db.MetaData()
+
+        for table in UUID_TABLES:
+            copy = table.tometadata(source_metadata)
+
+            for column in copy.c:
+                if isinstance(column.type, UUIDType):
+                    column.type = UUIDType(binary=source == 'binary')
+
+        source_metadata.create_all(db.engine)
+
+        for table in source_metadata.sorted_tables:
+            if rows[table.name]:
+                db.engine.execute(table.insert(), rows[table.name])
+
+        self.assertEqual(get_uuid_storage(), source)
+
+        result = app.test_cli_runner().invoke(args=['migrate-uuid-storage'])
+        self.assertIn(f'Converted keys from {source} to {target}', result.output)
+        self.assertIn('1 person rows, 1 productlist rows, 0 product rows', result.output)
+        self.assertEqual(get_uuid_storage(), target)
+        self.assertEqual(person_serializer.dump(db.session.query(*person_serializer.columns).one()), before)
+        self.assertEqual(ProductList.query.filter(ProductList.person_id == self.person_id).one().product_id,
+                         product_id)
+
+        result = app.test_cli_runner().invoke(args=['migrate-uuid-storage'])
+        self.assertIn(f'already stored as {target}', result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
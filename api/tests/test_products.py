@@ -0,0 +1,159 @@
+import time
+import unittest
+import uuid
+
+from api import create_app, cache, db, metrics, products
+from api.catalog import sync_catalog
+from api.models import Person, Product, ProductList
+from api.products import CircuitBreaker, ProductAPIUnavailable, fetch_products, get_product, get_products
+from api.routes.person import build_product_list, query_person_product_list
+from benchmarks.stub_api import StubProductAPI
+
+app = create_app()
+LATENCY = 0.05
+
+
+class ProductsTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubProductAPI(catalog_size=20, latency=LATENCY).start()
+        cls.catalog = cls.stub.catalog
+        app.config['EXTERNAL_API'] = cls.stub.endpoint
+        app.config['EXTERNAL_CATALOG_API'] = f'{cls.stub.url}?page=|PAGE|'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.drop_all()
+        db.create_all()
+        cache.clear()
+        self.stub.requests.clear()
+        products._breaker = None
+
+    def tearDown(self):
+        app.config['EXTERNAL_API'] = self.stub.endpoint
+        app.config['EXTERNAL_API_HEDGE_DELAY'] = 0
+        self.ctx.pop()
+
+    def test_fetch_products_keeps_order(self):
+        product_ids = list(self.catalog)
+        product_ids.insert(5, str(uuid.uuid4()))
+        started = time.monotonic()
+        products = fetch_products(product_ids)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(len(products), len(product_ids))
+        self.assertEqual(products[5], (404, None))
+        self.assertEqual([p['id'] for _, p in products if p is not None], list(self.catalog))
+        self.assertLess(elapsed, LATENCY * len(product_ids) / 2)
+
+    def test_get_product_uses_catalog_cache(self):
+        product_id = next(iter(self.catalog))
+        unknown_id = str(uuid.uuid4())
+
+        for _ in range(2):
+            product = get_product(product_id)
+            self.assertEqual(product['title'], self.catalog[product_id]['title'])
+            self.assertEqual(product['review_score'], self.catalog[product_id]['reviewScore'])
+            self.assertIsNone(get_product(unknown_id))
+
+        self.assertEqual(list(self.stub.requests), [f'/api/product/{product_id}/', f'/api/product/{unknown_id}/'])
+
+    def test_get_products_fetches_only_missing(self):
+        product_ids = list(self.catalog)
+        get_products(product_ids[:5])
+        self.stub.requests.clear()
+
+        products = get_products(product_ids)
+
+        self.assertEqual([p['id'] for p in products], product_ids)
+        self.assertEqual(sorted(self.stub.requests), sorted(f'/api/product/{product_id}/' for product_id in product_ids[5:]))
+
+    def test_sync_catalog(self):
+        stats = sync_catalog()
+        self.assertEqual((stats['pages'], stats['inserted']), (1, len(self.catalog)))
+        self.assertEqual(sync_catalog()['unchanged'], len(self.catalog))
+
+        product_id = next(iter(self.catalog))
+        self.catalog[product_id]['title'] = 'Renamed'
+
+        try:
+            self.assertEqual(sync_catalog()['updated'], 1)
+        finally:
+            self.catalog[product_id]['title'] = 'Product 0'
+
+        self.assertEqual(Product.query.get(uuid.UUID(product_id)).title, 'Renamed')
+        self.assertEqual(get_product(product_id)['title'], 'Renamed')
+
+    def test_product_list_served_from_snapshot(self):
+        sync_catalog()
+        person = Person(name='Snapshot', email='snapshot@teste.com')
+        db.session.add(person)
+        db.session.commit()
+        product_ids = list(self.catalog)[:5] + [str(uuid.uuid4())]
+
+        for product_id in product_ids:
+            db.session.add(ProductList(person_id=person.id, product_id=product_id))
+
+        db.session.commit()
+        self.stub.requests.clear()
+
+        product_list = build_product_list(query_person_product_list(person.id).all())
+
+        self.assertEqual(sorted(str(product['id']) for product in product_list), sorted(product_ids[:5]))
+        self.assertEqual(list(self.stub.requests), [f'/api/product/{product_ids[5]}/'])
+
+    def test_circuit_breaker_half_open(self):
+        breaker = CircuitBreaker(2, 0.05)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_breaker_opens_and_falls_back_to_snapshot(self):
+        sync_catalog()
+        cache.clear()
+        product_ids = list(self.catalog)[:10]
+        app.config['EXTERNAL_API'] = 'http://127.0.0.1:1/api/product/|PRODUCT_ID|/'
+        short_circuits = metrics.EXTERNAL_API_SHORT_CIRCUITS.value()
+
+        self.assertEqual([product['title'] for product in get_products(product_ids)],
+                         [self.catalog[product_id]['title'] for product_id in product_ids])
+        self.assertEqual(products.get_breaker().state, CircuitBreaker.OPEN)
+        self.assertGreater(metrics.EXTERNAL_API_SHORT_CIRCUITS.value(), short_circuits)
+        self.assertIn('external_api_circuit_state 1', metrics.expose())
+
+        unknown_id = str(uuid.uuid4())
+
+        with self.assertRaises(ProductAPIUnavailable) as context:
+            get_products([product_ids[0], unknown_id])
+
+        self.assertEqual(context.exception.product_ids, [unknown_id])
+        self.assertEqual(context.exception.products[0]['title'], self.catalog[product_ids[0]]['title'])
+
+    def test_hedged_request(self):
+        app.config['EXTERNAL_API_HEDGE_DELAY'] = LATENCY / 5
+        hedges = metrics.EXTERNAL_API_HEDGES.value()
+        product_id = next(iter(self.catalog))
+
+        self.assertEqual(fetch_products([product_id])[0][1]['title'], self.catalog[product_id]['title'])
+        self.assertEqual(metrics.EXTERNAL_API_HEDGES.value(), hedges + 1)
+        self.assertEqual(len(self.stub.requests), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import base64
+import time
+import unittest
+import uuid
+
+from unittest import mock
+from redis import WatchError
+from api import create_app, db, cache, metrics, ratelimit
+from api.models import Person
+from api.ratelimit import MemoryRateLimiter, SharedRateLimiter
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+app = create_app()
+
+
+class RateLimitTests(unittest.TestCase):
+    def login(self, user):
+        credentials = base64.b64encode(f'{user}:{app.config["PASSWORD"]}'.encode('utf-8')).decode('utf-8')
+        token = self.client.get('/login/', headers={'Authorization': 'Basic ' + credentials}).json['data']['token']
+        return {'Authorization': 'Bearer ' + token}
+
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.drop_all()
+        db.create_all()
+        cache.clear()
+        ratelimit._limiter = None
+        self.config = dict(app.config)
+        self.client = app.test_client()
+
+        person = Person(name='Limited', email='limited@teste.com')
+        db.session.add(person)
+        db.session.commit()
+        self.person_id = person.id
+
+    def tearDown(self):
+        app.config.update(self.config)
+        ratelimit._limiter = None
+        db.session.remove()
+        self.ctx.pop()
+
+    def test_bucket_sheds_with_retry_after(self):
+        app.config.update(RATE_LIMIT_PRODUCT_RATE=0.5, RATE_LIMIT_PRODUCT_BURST=2)
+        headers = self.login('alice')
+        shed = metrics.RATE_LIMITED.value('product', 'rate')
+
+        for _ in range(2):
+            self.assertEqual(self.client.get(f'/person/{self.person_id}/product', headers=headers).status_code, 200)
+
+        response = self.client.get(f'/person/{self.person_id}/product', headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '2')
+        self.assertEqual(metrics.RATE_LIMITED.value('product', 'rate'), shed + 1)
+
+        # Other route families and other users have their own buckets.
+        self.assertEqual(self.client.get(f'/person/{self.person_id}', headers=headers).status_code, 200)
+        self.assertEqual(self.client.get(f'/person/{self.person_id}/product', headers=self.login('bob')).status_code,
+                         200)
+
+    def test_in_flight_cap(self):
+        app.config.update(RATE_LIMIT_PERSON_IN_FLIGHT=1)
+        headers = self.login('alice')
+        limiter = ratelimit.get_limiter()
+        self.assertTrue(limiter.acquire('person_alice', 1))
+
+        response = self.client.get('/person/', headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+        limiter.release('person_alice')
+        self.assertEqual(self.client.get('/person/', headers=headers).status_code, 200)
+        self.assertEqual(self.client.get('/person/', headers=headers).status_code, 200)
+
+    def test_streamed_response_holds_slot_until_closed(self):
+        app.config.update(RATE_LIMIT_PERSON_IN_FLIGHT=1)
+        headers = self.login('alice')
+
+        response = self.client.get('/person/?stream=true', headers=headers, buffered=False)
+        self.assertEqual(self.client.get('/person/', headers=headers).status_code, 429)
+        response.close()
+        self.assertEqual(self.client.get('/person/', headers=headers).status_code, 200)
+
+    def test_memory_bucket_refills(self):
+        limiter = MemoryRateLimiter(max_clients=1)
+        self.assertEqual(limiter.take('a', 100, 1), 0)
+        self.assertGreater(limiter.take('a', 100, 1), 0)
+        time.sleep(0.02)
+        self.assertEqual(limiter.take('a', 100, 1), 0)
+
+        # Buckets over max_clients are evicted, starting over full.
+        limiter.take('b', 100, 1)
+        self.assertEqual(limiter.take('a', 100, 1), 0)
+
+    @unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+    def test_shared_limits_across_workers(self):
+        server = fakeredis.FakeServer()
+        worker_a = SharedRateLimiter(fakeredis.FakeRedis(server=server), 60)
+        worker_b = SharedRateLimiter(fakeredis.FakeRedis(server=server), 60)
+        key = f'product_{uuid.uuid4()}'
+
+        self.assertEqual(worker_a.take(key, 1, 2), 0)
+        self.assertEqual(worker_b.take(key, 1, 2), 0)
+        self.assertGreater(worker_a.take(key, 1, 2), 0)
+
+        self.assertTrue(worker_a.acquire(key, 1))
+        self.assertFalse(worker_b.acquire(key, 1))
+        worker_a.release(key)
+        self.assertTrue(worker_b.acquire(key, 1))
+
+    @unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+    def test_shared_bucket_contention_fails_open(self):
+        client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        ratelimit._limiter = SharedRateLimiter(client, 60, transaction_retries=2)
+        headers = self.login('alice')
+
+        def conflict(pipe, *args, **kwargs):
+            # As redis-py does when a watched key changed: the pipeline is reset and WatchError raised.
+            pipe.reset()
+            raise WatchError
+
+        with mock.patch.object(type(client.pipeline()), 'execute', autospec=True, side_effect=conflict) as execute:
+            with self.assertRaises(WatchError):
+                ratelimit._limiter.take('product_alice', 1, 2)
+
+            self.assertEqual(execute.call_count, 3)
+            self.assertEqual(self.client.get(f'/person/{self.person_id}/product', headers=headers).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import datetime
+import uuid
+
+from collections import Counter
+from flask import current_app as app, json
+from sqlalchemy.exc import SQLAlchemyError
+from api import db
+from api.caching import bump_generation, clear_person_product_list_cache
+from api.models import Person, ProductList, person_serializer, product_serializer, update_product_counts
+
+
+class ImportDataError(ValueError):
+    def __init__(self, line_number, message, stats):
+        super().__init__(f'Line {line_number}: {message}')
+        self.stats = stats
+
+
+def _parse_date(value):
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def _person_mapping(row):
+    mapping = {
+        'id': uuid.UUID(str(row['id'])) if row.get('id') else uuid.uuid4(),
+        'name': row['name'],
+        'email': row['email']
+    }
+
+    if row.get('create_date'):
+        mapping['create_date'] = _parse_date(row['create_date'])
+
+    return mapping
+
+
+def _product_mapping(row):
+    mapping = {
+        'person_id': uuid.UUID(str(row['person_id'])),
+        'product_id': uuid.UUID(str(row['product_id']))
+    }
+
+    if row.get('insert_date'):
+        mapping['insert_date'] = _parse_date(row['insert_date'])
+
+    return mapping
+
+
+def _flush(persons, products, stats, line_number):
+    try:
+        if persons:
+            db.session.bulk_insert_mappings(Person, persons)
+
+        if products:
+            db.session.bulk_insert_mappings(ProductList, products)
+            update_product_counts(Counter(product['person_id'] for product in products))
+
+        db.session.commit()
+    except SQLAlchemyError as err:
+        db.session.rollback()
+        raise ImportDataError(line_number, err, stats) from err
+
+    if persons:
+        bump_generation('person_list')
+
+    for person_id in {product['person_id'] for product in products}:
+        clear_person_product_list_cache(person_id)
+
+    stats['person'] += len(persons)
+    stats['product'] += len(products)
+    persons.clear()
+    products.clear()
+
+
+def import_ndjson(lines):
+    """Insert persons and wishlist items read from NDJSON lines.
+
+    Each line is either {"type": "person", "id", "name", "email", "create_date"} or
+    {"type": "product", "person_id", "product_id", "insert_date"}. Rows are inserted with bulk_insert_mappings and
+    committed every IMPORT_CHUNK_SIZE rows, so memory does not grow with the input.
+    """
+    chunk_size = int(app.config['IMPORT_CHUNK_SIZE'])
+    stats = {'person': 0, 'product': 0}
+    persons = []
+    products = []
+    line_number = 0
+
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+
+            if not isinstance(row, dict):
+                raise ValueError(f'Expected a JSON object, got {type(row).__name__}')
+
+            if row.get('type') == 'person':
+                persons.append(_person_mapping(row))
+            elif row.get('type') == 'product':
+                products.append(_product_mapping(row))
+            else:
+                raise ValueError(f'Unknown type: {row.get("type")}')
+        except (KeyError, TypeError, ValueError) as err:
+            db.session.rollback()
+            raise ImportDataError(line_number, err, stats) from err
+
+        if len(persons) + len(products) >= chunk_size:
+            _flush(persons, products, stats, line_number)
+
+    _flush(persons, products, stats, line_number)
+    return stats
+
+
+def export_ndjson():
+    """Yield every person and wishlist item as NDJSON lines, reading both tables in EXPORT_CHUNK_SIZE batches."""
+    chunk_size = int(app.config['EXPORT_CHUNK_SIZE'])
+    persons = db.session.query(*person_serializer.columns).order_by(Person.create_date)
+
+    for row in persons.yield_per(chunk_size):
+        yield json.dumps(dict(person_serializer.dump(row), type='person')) + '\n'
+
+    products = db.session.query(*product_serializer.columns).order_by(ProductList.person_id)
+
+    for row in products.yield_per(chunk_size):
+        yield json.dumps(dict(product_serializer.dump(row), type='product')) + '\n'
@@ -0,0 +1,160 @@
+"""Compare concurrent throughput of one sync worker (wsgi.py) against one gevent worker (wsgi_async.py).
+
+Both servers run in their own process on the same seeded SQLite database, with the local stub product API
+(benchmarks.stub_api) standing in for EXTERNAL_API and caching disabled (CACHE_TYPE=null), so every request pays the
+external API latency. --concurrency client threads request product list pages and add products for --duration seconds.
+
+Usage: python -m benchmarks.async_serving [--duration 10] [--concurrency 50] [--latency 0.05] [--persons 200]
+                                          [--products-per-person 10]
+"""
+import argparse
+import base64
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYNC_SERVER = ('from werkzeug.serving import run_simple; from wsgi import app; '
+               'run_simple("127.0.0.1", {port}, app, threaded=False)')
+
+
+def percentile(samples, value):
+    samples = sorted(samples)
+    return samples[max(int(round(len(samples) * value / 100)) - 1, 0)]
+
+
+def wait_for_server(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode}')
+
+        try:
+            requests.get(f'{url}/person/ping', timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+
+    raise RuntimeError(f'Server at {url} did not start')
+
+
+def run(mode, port, env, args, person_ids, product_ids):
+    command = [sys.executable, 'wsgi_async.py'] if mode == 'async' else \
+        [sys.executable, '-c', SYNC_SERVER.format(port=port)]
+    process = subprocess.Popen(command, cwd=ROOT, env=dict(env, PORT=str(port)), stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+
+    try:
+        wait_for_server(url, process)
+        credentials = base64.b64encode(f'bench:{env["PASSWORD"]}'.encode('utf-8')).decode('utf-8')
+        token = requests.get(f'{url}/login/', headers={'Authorization': f'Basic {credentials}'}).json()['data']['token']
+        headers = {'Authorization': f'Bearer {token}'}
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + args.duration
+
+        def worker(index):
+            rng = random.Random(index)
+            session = requests.Session()
+
+            while time.monotonic() < deadline:
+                person_id = rng.choice(person_ids)
+                started = time.perf_counter()
+
+                if rng.random() < 0.8:
+                    response = session.get(f'{url}/person/{person_id}/product?page=1', headers=headers)
+                else:
+                    response = session.post(f'{url}/person/{person_id}/product', headers=headers,
+                                            json={'product_id': rng.choice(product_ids)})
+
+                elapsed = time.perf_counter() - started
+
+                with lock:
+                    latencies.append(elapsed)
+
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(args.concurrency)]
+        started = time.monotonic()
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        elapsed = time.monotonic() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(f'{mode:<6}{len(latencies) / elapsed:>12.1f}{percentile(latencies, 50) * 1000:>10.1f}'
+          f'{percentile(latencies, 99) * 1000:>10.1f}{len(errors):>8}')
+    return len(latencies) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--persons', type=int, default=200)
+    parser.add_argument('--products-per-person', type=int, default=10)
+    parser.add_argument('--catalog-size', type=int, default=5000)
+    parser.add_argument('--port', type=int, default=5081)
+    args = parser.parse_args()
+
+    from benchmarks.seed import seed
+    from benchmarks.stub_api import StubProductAPI
+
+    stub = StubProductAPI(catalog_size=args.catalog_size, latency=args.latency).start()
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ,
+               SQLALCHEMY_DATABASE_URI=f'sqlite:///{os.path.join(workdir, "async.db")}',
+               CACHE_TYPE='null',
+               SECRET_KEY='async-serving',
+               PASSWORD='async-serving',
+               ITEMS_PER_PAGE='10',
+               LOG_FILE=os.path.join(workdir, 'api.log'),
+               LOG_LEVEL='WARNING',
+               EXTERNAL_API=stub.endpoint,
+               # All clients share one JWT user: the per-client rate limits would measure the limiter, not the app.
+               **{f'RATE_LIMIT_{family}_{limit}': '0' for family in ('PERSON', 'PRODUCT', 'CACHE')
+                  for limit in ('RATE', 'IN_FLIGHT')})
+    os.environ.update(env)
+
+    from api import create_app, db
+
+    app = create_app()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        person_ids = seed(args.persons, args.products_per_person, stub.product_ids)
+
+    print(f'{args.concurrency} concurrent clients, {args.duration:.0f}s per mode, '
+          f'{args.latency * 1000:.0f}ms external API latency')
+    print(f'{"mode":<6}{"req/s":>12}{"p50 ms":>10}{"p99 ms":>10}{"errors":>8}')
+
+    try:
+        sync = run('sync', args.port, env, args, person_ids, stub.product_ids)
+        cooperative = run('async', args.port + 1, env, args, person_ids, stub.product_ids)
+    finally:
+        stub.stop()
+
+    print(f'async/sync throughput per worker: {cooperative / sync:.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""Replay a realistic traffic mix against create_app() and report latency percentiles and throughput.
+
+A local stub product API (benchmarks.stub_api) stands in for EXTERNAL_API and the database is seeded with
+benchmarks.seed. Each worker thread uses its own test client and picks operations by weight for --duration seconds.
+The run fails (exit code 1) when a threshold such as --max-p99-ms or --max-error-rate is exceeded, so it can gate
+regressions in CI.
+
+Usage: python -m benchmarks.load_test [--duration 30] [--concurrency 8] [--persons 1000] [--products-per-person 50]
+                                      [--latency 0.02] [--error-rate 0.0] [--catalog-size 5000]
+                                      [--mix product_page=5,list_persons=2,...] [--max-p99-ms 500]
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from collections import defaultdict
+
+DEFAULT_MIX = 'login=1,list_persons=3,get_person=3,create_person=1,update_person=1,product_page=6,add_product=1'
+
+
+def percentile(samples, value):
+    samples = sorted(samples)
+    return samples[max(int(round(len(samples) * value / 100)) - 1, 0)]
+
+
+class Scenario:
+    def __init__(self, client, person_ids, product_ids, items_per_page, products_per_person, credentials, token, rng):
+        self.client = client
+        self.person_ids = person_ids
+        self.product_ids = product_ids
+        self.pages = max((products_per_person + items_per_page - 1) // items_per_page, 1)
+        self.credentials = credentials
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.rng = rng
+
+    def login(self):
+        return self.client.get('/login/', headers={'Authorization': f'Basic {self.credentials}'})
+
+    def list_persons(self):
+        return self.client.get('/person/', headers=self.headers)
+
+    def get_person(self):
+        return self.client.get(f'/person/{self.rng.choice(self.person_ids)}', headers=self.headers)
+
+    def create_person(self):
+        suffix = uuid.uuid4().hex
+        return self.client.post('/person/', headers=self.headers, content_type='application/json',
+                                data=json.dumps({'name': f'Load {suffix[:8]}', 'email': f'{suffix}@load.com'}))
+
+    def update_person(self):
+        suffix = uuid.uuid4().hex
+        return self.client.put(f'/person/{self.rng.choice(self.person_ids)}', headers=self.headers,
+                               content_type='application/json',
+                               data=json.dumps({'name': f'Load {suffix[:8]}', 'email': f'{suffix}@load.com'}))
+
+    def product_page(self):
+        return self.client.get(f'/person/{self.rng.choice(self.person_ids)}/product?page={self.rng.randint(1, self.pages)}',
+                               headers=self.headers)
+
+    def add_product(self):
+        return self.client.post(f'/person/{self.rng.choice(self.person_ids)}/product', headers=self.headers,
+                                content_type='application/json',
+                                data=json.dumps({'product_id': self.rng.choice(self.product_ids)}))
+
+
+def parse_mix(value):
+    mix = {}
+
+    for item in value.split(','):
+        name, weight = item.split('=')
+
+        if not hasattr(Scenario, name):
+            raise argparse.ArgumentTypeError(f'Unknown operation: {name}')
+
+        mix[name] = float(weight)
+
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--persons', type=int, default=1000)
+    parser.add_argument('--products-per-person', type=int, default=50)
+    parser.add_argument('--items-per-page', type=int, default=10)
+    parser.add_argument('--catalog-size', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-p99-ms', type=float)
+    parser.add_argument('--max-error-rate', type=float)
+    args = parser.parse_args()
+
+    from benchmarks.seed import seed
+    from benchmarks.stub_api import StubProductAPI
+
+    stub = StubProductAPI(catalog_size=args.catalog_size, latency=args.latency, error_rate=args.error_rate,
+                          seed=args.seed).start()
+    os.environ.setdefault('SQLALCHEMY_DATABASE_URI', f'sqlite:///{os.path.join(tempfile.mkdtemp(), "load.db")}')
+    os.environ.setdefault('CACHE_TYPE', 'simple')
+    os.environ.setdefault('SECRET_KEY', 'load-test')
+    os.environ.setdefault('PASSWORD', 'load-test')
+    os.environ['EXTERNAL_API'] = stub.endpoint
+    os.environ['ITEMS_PER_PAGE'] = str(args.items_per_page)
+
+    # Every worker shares one JWT user: the per-client rate limits would measure the limiter, not the app.
+    for family in ('PERSON', 'PRODUCT', 'CACHE'):
+        os.environ[f'RATE_LIMIT_{family}_RATE'] = '0'
+        os.environ[f'RATE_LIMIT_{family}_IN_FLIGHT'] = '0'
+
+    from api import create_app, db
+
+    app = create_app()
+    app.logger.setLevel(logging.WARNING)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.monotonic()
+        person_ids = seed(args.persons, args.products_per_person, stub.product_ids, args.seed)
+        print(f'Seeded {args.persons} persons x {args.products_per_person} products '
+              f'in {time.monotonic() - started:.1f}s')
+
+    credentials = base64.b64encode(f'load:{app.config["PASSWORD"]}'.encode('utf-8')).decode('utf-8')
+    token = app.test_client().get('/login/', headers={'Authorization': f'Basic {credentials}'}).json['data']['token']
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        scenario = Scenario(app.test_client(), person_ids, stub.product_ids, args.items_per_page,
+                            args.products_per_person, credentials, token, rng)
+
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            response = getattr(scenario, name)()
+            elapsed = time.perf_counter() - started
+
+            with lock:
+                latencies[name].append(elapsed)
+
+                if response.status_code >= 400:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(args.concurrency)]
+    started = time.monotonic()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.monotonic() - started
+    stub.stop()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    total_errors = sum(errors.values())
+    print(f'{"operation":<15}{"count":>8}{"errors":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+
+    for name in names + ['total']:
+        samples = all_latencies if name == 'total' else latencies[name]
+
+        if not samples:
+            continue
+
+        print(f'{name:<15}{len(samples):>8}{total_errors if name == "total" else errors[name]:>8}'
+              f'{percentile(samples, 50) * 1000:>10.1f}{percentile(samples, 95) * 1000:>10.1f}'
+              f'{percentile(samples, 99) * 1000:>10.1f}')
+
+    print(f'throughput: {len(all_latencies) / elapsed:.1f} req/s over {elapsed:.1f}s '
+          f'with {args.concurrency} workers, {len(stub.requests)} stub API calls')
+
+    failures = []
+
+    if args.max_p99_ms is not None and all_latencies and percentile(all_latencies, 99) * 1000 > args.max_p99_ms:
+        failures.append(f'p99 {percentile(all_latencies, 99) * 1000:.1f}ms > {args.max_p99_ms}ms')
+
+    if args.max_error_rate is not None and all_latencies and total_errors / len(all_latencies) > args.max_error_rate:
+        failures.append(f'error rate {total_errors / len(all_latencies):.3f} > {args.max_error_rate}')
+
+    for failure in failures:
+        print(f'FAILED: {failure}')
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
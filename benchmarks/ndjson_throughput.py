@@ -0,0 +1,58 @@
+"""Measure NDJSON import/export throughput against a scratch SQLite database.
+
+Usage: python -m benchmarks.ndjson_throughput [--persons 100000] [--products-per-person 10]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+
+def generate(persons, products_per_person):
+    for i in range(persons):
+        person_id = str(uuid.uuid4())
+        yield f'{{"type": "person", "id": "{person_id}", "name": "Person {i}", "email": "person{i}@bench.com"}}\n'
+
+        for _ in range(products_per_person):
+            yield f'{{"type": "product", "person_id": "{person_id}", "product_id": "{uuid.uuid4()}"}}\n'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--persons', type=int, default=100000)
+    parser.add_argument('--products-per-person', type=int, default=10)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(directory, "bench.db")}'
+    os.environ.setdefault('CACHE_TYPE', 'simple')
+    os.environ.setdefault('ITEMS_PER_PAGE', '10')
+
+    from api import create_app, db
+    from api.transfer import export_ndjson, import_ndjson
+
+    app = create_app()
+    app.logger.setLevel(logging.WARNING)
+
+    with app.app_context():
+        db.create_all()
+        started = time.monotonic()
+        stats = import_ndjson(generate(args.persons, args.products_per_person))
+        elapsed = time.monotonic() - started
+        rows = stats['person'] + stats['product']
+        print(f'import: {stats["person"]} persons, {stats["product"]} products in {elapsed:.2f}s '
+              f'({rows / elapsed:.0f} rows/s)')
+
+        started = time.monotonic()
+        exported = sum(1 for _ in export_ndjson())
+        elapsed = time.monotonic() - started
+        print(f'export: {exported} rows in {elapsed:.2f}s ({exported / elapsed:.0f} rows/s)')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
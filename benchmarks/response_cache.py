@@ -0,0 +1,81 @@
+"""Compare cache-hit latency of a product list page: cached Python objects vs cached response bytes.
+
+"before" is the previous hot path: cache.get() of the product list, jsonify() and gzip of the body.
+"after" is get_cached_response(), which returns the stored (pre-compressed) bytes.
+
+Usage: python -m benchmarks.response_cache [--items 100] [--iterations 5000]
+"""
+import argparse
+import gzip
+import logging
+import os
+import statistics
+import sys
+import time
+import uuid
+
+
+def percentile(samples, value):
+    return sorted(samples)[int(len(samples) * value / 100) - 1]
+
+
+def report(name, samples):
+    print(f'{name}: mean {statistics.mean(samples) * 1e6:.1f}us, p50 {percentile(samples, 50) * 1e6:.1f}us, '
+          f'p99 {percentile(samples, 99) * 1e6:.1f}us')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+    os.environ.setdefault('CACHE_TYPE', 'simple')
+
+    from flask import jsonify, make_response
+    from api import create_app, cache
+    from api.caching import get_cached_response
+
+    app = create_app()
+    app.logger.setLevel(logging.WARNING)
+    person_id = uuid.uuid4()
+    product_list = [
+        {'id': uuid.uuid4(), 'title': f'Product {i}', 'image': f'http://images.example.com/{uuid.uuid4()}.jpg',
+         'price': 1699.0, 'review_score': 4.352941}
+        for i in range(args.items)
+    ]
+
+    def load():
+        return {'message': 'Success', 'data': {'person_id': person_id, 'product_list': product_list}}, 200
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        cache.set('before', product_list)
+        get_cached_response('after', load, 3600)
+
+        for name in ('before', 'after'):
+            samples = []
+
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+
+                if name == 'before':
+                    response = make_response(jsonify(
+                        {
+                            'message': 'Success',
+                            'data': {'person_id': person_id, 'product_list': cache.get('before')}
+                        }), 200)
+                    response.set_data(gzip.compress(response.get_data(), 6))
+                else:
+                    response = get_cached_response('after', load, 3600)
+                    response.get_data()
+
+                samples.append(time.perf_counter() - started)
+
+            report(name, samples)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
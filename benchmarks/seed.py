@@ -0,0 +1,85 @@
+"""Seed the configured database (SQLALCHEMY_DATABASE_URI, SQLite or Postgres) with persons and wishlists.
+
+Wishlist products are drawn from the stub API catalog (see benchmarks.stub_api), so product pages resolve.
+
+Usage: python -m benchmarks.seed [--persons 10000] [--products-per-person 50] [--catalog-size 10000]
+"""
+import argparse
+import datetime
+import random
+import sys
+import time
+import uuid
+
+from benchmarks.stub_api import generate_catalog
+
+CHUNK_SIZE = 5000
+
+
+def seed(persons, products_per_person, product_ids, seed=0):
+    """Insert persons and their wishlists in bulk; return the ids of the inserted persons."""
+    from api import db
+    from api.models import Person, ProductList
+
+    rng = random.Random(seed)
+    person_ids = []
+    person_rows = []
+    product_rows = []
+    now = datetime.datetime.utcnow()
+
+    def flush():
+        db.session.bulk_insert_mappings(Person, person_rows)
+        db.session.bulk_insert_mappings(ProductList, product_rows)
+        db.session.commit()
+        person_rows.clear()
+        product_rows.clear()
+
+    for i in range(persons):
+        person_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+        person_ids.append(person_id)
+        person_rows.append({
+            'id': person_id,
+            'name': f'Person {i}',
+            'email': f'person{i}.{person_id.hex[:8]}@bench.com',
+            'create_date': now + datetime.timedelta(microseconds=i),
+            'product_count': min(products_per_person, len(product_ids))
+        })
+
+        for j, product_id in enumerate(rng.sample(product_ids, min(products_per_person, len(product_ids)))):
+            product_rows.append({
+                'person_id': person_id,
+                'product_id': uuid.UUID(product_id),
+                'insert_date': now + datetime.timedelta(microseconds=j)
+            })
+
+        if len(person_rows) + len(product_rows) >= CHUNK_SIZE:
+            flush()
+
+    flush()
+    return person_ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--persons', type=int, default=10000)
+    parser.add_argument('--products-per-person', type=int, default=50)
+    parser.add_argument('--catalog-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from api import create_app, db
+
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        started = time.monotonic()
+        seed(args.persons, args.products_per_person, list(generate_catalog(args.catalog_size, args.seed)), args.seed)
+        print(f'Seeded {args.persons} persons with {args.products_per_person} products each '
+              f'in {time.monotonic() - started:.2f}s')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Compare PersonSchema(many=True).dump() on ORM objects with the compiled person_serializer on row tuples.
+
+Both outputs are rendered with jsonify() and checked to be byte-for-byte identical.
+
+Usage: python -m benchmarks.serialization [--rows 10000 100000]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    os.environ.setdefault('CACHE_TYPE', 'simple')
+
+    from flask import jsonify
+    from api import create_app, db
+    from api.models import Person, PersonSchema, person_serializer
+
+    app = create_app()
+    app.logger.setLevel(logging.WARNING)
+
+    with app.app_context():
+        db.create_all()
+
+        for rows in args.rows:
+            db.session.query(Person).delete()
+            db.session.bulk_insert_mappings(Person, [
+                {'name': f'Person {i}', 'email': f'person{i}@bench.com'} for i in range(rows)
+            ])
+            db.session.commit()
+
+            persons = Person.query.order_by(Person.create_date, Person.id).all()
+            started = time.perf_counter()
+            before = PersonSchema(many=True).dump(persons)
+            marshmallow_dump = time.perf_counter() - started
+            before = jsonify(before)
+            marshmallow_elapsed = time.perf_counter() - started
+            db.session.expunge_all()
+
+            result = db.session.query(*person_serializer.columns).order_by(Person.create_date, Person.id).all()
+            started = time.perf_counter()
+            after = person_serializer.dump_many(result)
+            compiled_dump = time.perf_counter() - started
+            after = jsonify(after)
+            compiled_elapsed = time.perf_counter() - started
+
+            assert before.get_data() == after.get_data(), 'outputs differ'
+            print(f'{rows} rows: dump marshmallow {marshmallow_dump * 1000:.0f}ms / compiled {compiled_dump * 1000:.0f}ms '
+                  f'({marshmallow_dump / compiled_dump:.1f}x), dump + jsonify marshmallow '
+                  f'{marshmallow_elapsed * 1000:.0f}ms / compiled {compiled_elapsed * 1000:.0f}ms '
+                  f'({marshmallow_elapsed / compiled_elapsed:.1f}x)')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Measure worker startup: cold `import api` plus create_app(), each run in a fresh interpreter.
+
+Also reports what create_app() left behind: database engines, extra threads and open log files, which
+should all be zero so a master process can create the app once and fork its workers (preload-then-fork).
+
+Usage: python -m benchmarks.startup [--runs 20]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE = '''
+import json
+import os
+import threading
+import time
+
+started = time.perf_counter()
+import api
+imported = time.perf_counter()
+app = api.create_app()
+created = time.perf_counter()
+
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'threads': threading.active_count() - 1,
+    'engines': len(app.extensions['sqlalchemy'].connectors),
+    'log_files': sum(1 for fd in os.listdir('/proc/self/fd') if os.path.realpath(f'/proc/self/fd/{fd}').endswith('.log'))
+}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ,
+               SQLALCHEMY_DATABASE_URI=os.getenv('SQLALCHEMY_DATABASE_URI', f'sqlite:///{os.path.join(workdir, "startup.db")}'),
+               CACHE_TYPE=os.getenv('CACHE_TYPE', 'simple'),
+               LOG_FILE=os.path.join(workdir, 'api.log'))
+    samples = []
+
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, check=True, capture_output=True,
+                                text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    for name in ('import', 'create_app'):
+        values = [sample[name] * 1000 for sample in samples]
+        print(f'{name:<12} mean {statistics.mean(values):7.1f}ms  median {statistics.median(values):7.1f}ms  '
+              f'min {min(values):7.1f}ms')
+
+    total = [(sample['import'] + sample['create_app']) * 1000 for sample in samples]
+    print(f'{"total":<12} mean {statistics.mean(total):7.1f}ms  median {statistics.median(total):7.1f}ms  '
+          f'min {min(total):7.1f}ms')
+    print(f'after create_app(): {samples[-1]["threads"]} extra threads, {samples[-1]["engines"]} database engines, '
+          f'{samples[-1]["log_files"]} open log files')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
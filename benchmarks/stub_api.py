@@ -0,0 +1,145 @@
+"""Local stand-in for the external product API (EXTERNAL_API).
+
+Serves GET /api/product/<id>/ and the paginated catalog GET /api/product/?page=<n>, with configurable latency,
+error rate and catalog size. The catalog is generated from a seed, so the same seed always yields the same ids.
+
+Usage: python -m benchmarks.stub_api [--port 8001] [--catalog-size 10000] [--latency 0.05] [--error-rate 0.01]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE = 100
+
+
+def generate_catalog(size, seed=0):
+    rng = random.Random(seed)
+    catalog = {}
+
+    for i in range(size):
+        product_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        catalog[product_id] = {
+            'id': product_id,
+            'title': f'Product {i}',
+            'image': f'http://images.example.com/images/{product_id}.jpg',
+            'price': round(rng.uniform(1, 5000), 2),
+            'brand': f'Brand {i % 50}',
+            'reviewScore': round(rng.uniform(0, 5), 6)
+        }
+
+    return catalog
+
+
+class StubProductAPI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), catalog_size=1000, latency=0.0, error_rate=0.0, seed=0):
+        super().__init__(address, ProductHandler)
+        self.catalog = generate_catalog(catalog_size, seed)
+        self.product_ids = list(self.catalog)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = deque(maxlen=100000)
+        self._random = random.Random(seed)
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_port}/api/product/'
+
+    @property
+    def endpoint(self):
+        """Value for the EXTERNAL_API setting."""
+        return f'{self.url}|PRODUCT_ID|/'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class ProductHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        server.requests.append(url.path)
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.error_rate and server._random.random() < server.error_rate:
+            return self.send_json(500, {'error': 'Internal Server Error'})
+
+        parts = [part for part in url.path.split('/') if part]
+
+        if parts[:2] != ['api', 'product']:
+            return self.send_json(404, {'error': 'Not Found'})
+
+        if len(parts) == 2:
+            page = int(parse_qs(url.query).get('page', ['1'])[0])
+            products = server.product_ids[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+
+            if not products:
+                return self.send_json(404, {'error_message': 'Page not found'})
+
+            return self.send_json(200, {
+                'meta': {'page_number': page, 'page_size': PAGE_SIZE},
+                'products': [server.catalog[product_id] for product_id in products]
+            })
+
+        product = server.catalog.get(parts[2])
+
+        if product is None:
+            return self.send_json(404, {'error_message': 'Product not found', 'code': 'not_found'})
+
+        return self.send_json(200, product)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--catalog-size', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubProductAPI((args.host, args.port), args.catalog_size, args.latency, args.error_rate, args.seed)
+    print(f'Serving {len(server.catalog)} products, EXTERNAL_API={server.endpoint}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
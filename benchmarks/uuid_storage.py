@@ -0,0 +1,142 @@
+"""Compare key storage (UUID_STORAGE=string, CHAR(32), against UUID_STORAGE=binary, BINARY(16)) on SQLite.
+
+Each mode runs in its own interpreter, since the column types are fixed when the models are imported, and builds a
+database with --rows wishlist rows (--products-per-person per person). It reports the database size, the size of the
+productlist primary key and of the wishlist index (from SQLite's dbstat table), and the latency of a wishlist page
+query (the index range scan behind GET /person/<id>/product) and of a primary key lookup for random persons.
+
+Usage: python -m benchmarks.uuid_storage [--rows 10000000] [--products-per-person 50] [--lookups 20000]
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK_SIZE = 50000
+WISHLIST_INDEX = 'ix_productlist_person_id_insert_date_product_id'
+
+
+def build(rows, products_per_person):
+    from api import db
+    from api.models import Person, ProductList
+
+    rng = random.Random(0)
+    now = datetime.datetime.utcnow()
+    person_ids = []
+    connection = db.engine.connect()
+
+    with connection.begin():
+        for start in range(0, rows // products_per_person, CHUNK_SIZE // products_per_person):
+            persons = []
+            products = []
+
+            for i in range(start, min(start + CHUNK_SIZE // products_per_person, rows // products_per_person)):
+                person_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+                person_ids.append(person_id)
+                persons.append({'id': person_id, 'name': f'Person {i}', 'email': f'person{i}@bench.com',
+                                'create_date': now, 'product_count': products_per_person})
+                products.extend({'person_id': person_id, 'product_id': uuid.UUID(int=rng.getrandbits(128), version=4),
+                                 'insert_date': now + datetime.timedelta(microseconds=j)}
+                                for j in range(products_per_person))
+
+            connection.execute(Person.__table__.insert(), persons)
+            connection.execute(ProductList.__table__.insert(), products)
+
+    connection.close()
+    return person_ids
+
+
+def measure(person_ids, lookups, items_per_page=10):
+    from api import db
+    from api.models import Person, ProductList
+
+    rng = random.Random(1)
+    sample = [rng.choice(person_ids) for _ in range(lookups)]
+    page = db.select([ProductList.product_id, ProductList.insert_date]) \
+        .where(ProductList.person_id == db.bindparam('person_id')) \
+        .order_by(ProductList.insert_date, ProductList.product_id).limit(items_per_page)
+    get = db.select([Person.name]).where(Person.id == db.bindparam('person_id'))
+    results = {}
+
+    with db.engine.connect() as connection:
+        for name, query in (('page', page), ('get', get)):
+            started = time.perf_counter()
+
+            for person_id in sample:
+                connection.execute(query, person_id=person_id).fetchall()
+
+            results[f'{name}_us'] = (time.perf_counter() - started) / lookups * 1e6
+
+        sizes = dict(connection.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name').fetchall())
+
+    results['file_bytes'] = sum(sizes.values())
+    results['pk_bytes'] = sum(size for name, size in sizes.items() if name.startswith('sqlite_autoindex_productlist'))
+    results['index_bytes'] = sizes[WISHLIST_INDEX]
+    results['table_bytes'] = sizes['productlist']
+    return results
+
+
+def run_mode(args):
+    from api import create_app, db
+
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        started = time.monotonic()
+        person_ids = build(args.rows, args.products_per_person)
+        built = time.monotonic() - started
+        results = measure(person_ids, args.lookups)
+
+    results['build_s'] = built
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--products-per-person', type=int, default=50)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--storage', choices=('string', 'binary'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.storage:
+        return run_mode(args)
+
+    workdir = tempfile.mkdtemp()
+    print(f'{args.rows} wishlist rows, {args.rows // args.products_per_person} persons, {args.lookups} lookups')
+    print(f'{"storage":<9}{"file MB":>10}{"table MB":>10}{"pk MB":>10}{"index MB":>10}{"page us":>10}{"get us":>10}'
+          f'{"build s":>10}')
+    results = {}
+
+    for storage in ('string', 'binary'):
+        env = dict(os.environ,
+                   UUID_STORAGE=storage,
+                   SQLALCHEMY_DATABASE_URI=f'sqlite:///{os.path.join(workdir, f"{storage}.db")}',
+                   CACHE_TYPE=os.getenv('CACHE_TYPE', 'simple'),
+                   LOG_FILE=os.path.join(workdir, 'api.log'))
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.uuid_storage', '--storage', storage,
+                                 '--rows', str(args.rows), '--products-per-person', str(args.products_per_person),
+                                 '--lookups', str(args.lookups)],
+                                cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+        result = results[storage] = json.loads(output.strip().splitlines()[-1])
+        mb = 1024 * 1024
+        print(f'{storage:<9}{result["file_bytes"] / mb:>10.1f}{result["table_bytes"] / mb:>10.1f}'
+              f'{result["pk_bytes"] / mb:>10.1f}{result["index_bytes"] / mb:>10.1f}{result["page_us"]:>10.1f}'
+              f'{result["get_us"]:>10.1f}{result["build_s"]:>10.1f}')
+
+    for name in ('file_bytes', 'pk_bytes', 'index_bytes', 'page_us', 'get_us'):
+        print(f'binary/string {name}: {results["binary"][name] / results["string"][name]:.2f}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,16 +12,78 @@ class Config:
     # Auth
     SECRET_KEY = os.getenv('SECRET_KEY')
     PASSWORD = os.getenv('PASSWORD')
+    TOKEN_CACHE_SIZE = os.getenv('TOKEN_CACHE_SIZE', 1024)
 
     # Database
     SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS')
+    DB_REPLICA_URI = os.getenv('DB_REPLICA_URI')
+    DB_REPLICA_CACHE_TIMEOUT = os.getenv('DB_REPLICA_CACHE_TIMEOUT', 5)
+    DB_POOL_SIZE = os.getenv('DB_POOL_SIZE', 5)
+    DB_MAX_OVERFLOW = os.getenv('DB_MAX_OVERFLOW', 10)
+    DB_POOL_TIMEOUT = os.getenv('DB_POOL_TIMEOUT', 30)
+    DB_POOL_RECYCLE = os.getenv('DB_POOL_RECYCLE', 1800)
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true')
+    UUID_STORAGE = os.getenv('UUID_STORAGE', 'string')
 
     # External
     EXTERNAL_API = os.getenv('EXTERNAL_API')
+    EXTERNAL_API_MAX_WORKERS = os.getenv('EXTERNAL_API_MAX_WORKERS', 10)
+    EXTERNAL_API_CONNECT_TIMEOUT = os.getenv('EXTERNAL_API_CONNECT_TIMEOUT', 2)
+    EXTERNAL_API_READ_TIMEOUT = os.getenv('EXTERNAL_API_READ_TIMEOUT', 5)
+    EXTERNAL_API_RETRIES = os.getenv('EXTERNAL_API_RETRIES', 2)
+    EXTERNAL_API_RETRY_BACKOFF = os.getenv('EXTERNAL_API_RETRY_BACKOFF', 0.1)
+    EXTERNAL_API_HEDGE_DELAY = os.getenv('EXTERNAL_API_HEDGE_DELAY', 0)
+    EXTERNAL_API_BREAKER_THRESHOLD = os.getenv('EXTERNAL_API_BREAKER_THRESHOLD', 5)
+    EXTERNAL_API_BREAKER_RESET_TIMEOUT = os.getenv('EXTERNAL_API_BREAKER_RESET_TIMEOUT', 30)
+    EXTERNAL_CATALOG_API = os.getenv('EXTERNAL_CATALOG_API')
+    PRODUCT_SNAPSHOT_MAX_AGE = os.getenv('PRODUCT_SNAPSHOT_MAX_AGE', 86400)
 
     # Pagination
     ITEMS_PER_PAGE = os.getenv('ITEMS_PER_PAGE')
+    PERSON_STREAM_CHUNK_SIZE = os.getenv('PERSON_STREAM_CHUNK_SIZE', 1000)
+
+    # Batch
+    BATCH_MAX_ITEMS = os.getenv('BATCH_MAX_ITEMS', 500)
+    IMPORT_CHUNK_SIZE = os.getenv('IMPORT_CHUNK_SIZE', 5000)
+    EXPORT_CHUNK_SIZE = os.getenv('EXPORT_CHUNK_SIZE', 5000)
 
     # Cache
     CACHE_TYPE = os.getenv('CACHE_TYPE')
+    L1_CACHE_SIZE = os.getenv('L1_CACHE_SIZE', 1024)
+    L1_CACHE_TIMEOUT = os.getenv('L1_CACHE_TIMEOUT', 5)
+    L1_CACHE_CHANNEL = os.getenv('L1_CACHE_CHANNEL', 'cache_l1_invalidation')
+    CACHE_STALE_TIMEOUT = os.getenv('CACHE_STALE_TIMEOUT', 60)
+    CACHE_GENERATION_TIMEOUT = os.getenv('CACHE_GENERATION_TIMEOUT', 86400)
+    CACHE_LOCK_TIMEOUT = os.getenv('CACHE_LOCK_TIMEOUT', 10)
+    RESPONSE_COMPRESSION_MIN_SIZE = os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', 1024)
+    RESPONSE_COMPRESSION_LEVEL = os.getenv('RESPONSE_COMPRESSION_LEVEL', 6)
+    PRODUCT_CACHE_TIMEOUT = os.getenv('PRODUCT_CACHE_TIMEOUT', 3600)
+    PRODUCT_NOT_FOUND_CACHE_TIMEOUT = os.getenv('PRODUCT_NOT_FOUND_CACHE_TIMEOUT', 300)
+    DEGRADED_CACHE_TIMEOUT = os.getenv('DEGRADED_CACHE_TIMEOUT', 30)
+
+    # Serving
+    ASYNC_MAX_CONNECTIONS = os.getenv('ASYNC_MAX_CONNECTIONS', 1000)
+
+    # Rate limiting (per JWT user and route family; a rate or in-flight limit of 0 disables it)
+    RATE_LIMIT_STORAGE = os.getenv('RATE_LIMIT_STORAGE', 'memory')
+    RATE_LIMIT_MAX_CLIENTS = os.getenv('RATE_LIMIT_MAX_CLIENTS', 10000)
+    RATE_LIMIT_IN_FLIGHT_TIMEOUT = os.getenv('RATE_LIMIT_IN_FLIGHT_TIMEOUT', 60)
+    RATE_LIMIT_PERSON_RATE = os.getenv('RATE_LIMIT_PERSON_RATE', 50)
+    RATE_LIMIT_PERSON_BURST = os.getenv('RATE_LIMIT_PERSON_BURST', 100)
+    RATE_LIMIT_PERSON_IN_FLIGHT = os.getenv('RATE_LIMIT_PERSON_IN_FLIGHT', 16)
+    RATE_LIMIT_PRODUCT_RATE = os.getenv('RATE_LIMIT_PRODUCT_RATE', 10)
+    RATE_LIMIT_PRODUCT_BURST = os.getenv('RATE_LIMIT_PRODUCT_BURST', 50)
+    RATE_LIMIT_PRODUCT_IN_FLIGHT = os.getenv('RATE_LIMIT_PRODUCT_IN_FLIGHT', 4)
+    RATE_LIMIT_CACHE_RATE = os.getenv('RATE_LIMIT_CACHE_RATE', 5)
+    RATE_LIMIT_CACHE_BURST = os.getenv('RATE_LIMIT_CACHE_BURST', 10)
+    RATE_LIMIT_CACHE_IN_FLIGHT = os.getenv('RATE_LIMIT_CACHE_IN_FLIGHT', 2)
+
+    # Metrics
+    SLOW_REQUEST_THRESHOLD = os.getenv('SLOW_REQUEST_THRESHOLD', 1.0)
+
+    # Logging
+    LOG_FILE = os.getenv('LOG_FILE', 'logs/api.log')
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_MAX_BYTES = os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)
+    LOG_BACKUP_COUNT = os.getenv('LOG_BACKUP_COUNT', 5)
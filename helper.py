@@ -1,4 +1,7 @@
+import base64
 import datetime
+import json
+import uuid
 
 
 def get_hours_in_seconds(hours):
@@ -9,5 +12,23 @@ def is_json_content(request):
     return True if request.content_type == 'application/json' else False
 
 
+def is_ndjson_content(request):
+    return True if request.content_type == 'application/x-ndjson' else False
+
+
 def is_empty_content_length(request):
     return True if request and request.content_length and request.content_length <= 0 else False
+
+
+def encode_cursor(date, item_id):
+    payload = json.dumps([date.isoformat(), str(item_id)]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('utf-8').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        date, item_id = json.loads(payload.decode('utf-8'))
+        return datetime.datetime.fromisoformat(date), uuid.UUID(item_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as err:
+        raise ValueError(f'Invalid cursor: {cursor}') from err
@@ -0,0 +1,39 @@
+"""Cooperative serving mode: the same create_app() app, served by gevent.
+
+Sockets are patched before anything else is imported, so a request waiting on the external product API (through the
+shared requests session and its connection pool) or on the database yields the worker to the other requests instead
+of blocking it. PostgreSQL goes through psycopg2's wait callback when psycogreen is installed; SQLite calls still
+block the worker while they run.
+
+Usage: python wsgi_async.py, or gunicorn -k gevent wsgi_async:app
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import os
+
+try:
+    from psycogreen.gevent import patch_psycopg
+except ImportError:
+    patch_psycopg = None
+
+from api import create_app
+
+if patch_psycopg is not None:
+    patch_psycopg()
+
+app = create_app()
+
+# Product API calls run on greenlets here, so the shared fetch pool can be much larger than with OS threads. config.py
+# has loaded .env into the environment by now, so this only applies when neither of them sets the key.
+if 'EXTERNAL_API_MAX_WORKERS' not in os.environ:
+    app.config['EXTERNAL_API_MAX_WORKERS'] = 200
+
+if __name__ == "__main__":
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+
+    server = WSGIServer(('0.0.0.0', int(os.getenv('PORT', 5000))), app,
+                        spawn=Pool(int(app.config['ASYNC_MAX_CONNECTIONS'])), log=None)
+    server.serve_forever()